@@ -0,0 +1,555 @@
+import io
+import os
+import struct
+import zipfile
+import zlib
+import numpy as np
+import PIL
+from PIL import Image, GifImagePlugin, features
+
+## streaming writers for the stitched animations: GIF, animated WebP (lossless), APNG and a
+## raw .npz frame stack. frames are encoded and appended to the output file one at a time, so
+## memory stays constant however many frames a group has; the file is written under a temp
+## name and moved into place on close. one frame is held back so a run of identical frames
+## can be written once with the combined duration
+
+# Convert a frame the way Pillow's GIF encoder does; returns (palette image, transparency index or None)
+def gif_frame(image):
+    if image.mode in ("P", "L"):
+        return image, image.info.get("transparency")
+    frame = image.convert("P", palette=Image.Palette.ADAPTIVE)
+    transparency = None
+    if frame.palette.mode == "RGBA":
+        transparency = next((index for color, index in frame.palette.colors.items() if color[3] == 0), None)
+    return frame, transparency
+
+# RGBA palette entries of a P image (256 rows), with the tRNS transparency applied to the alpha column
+def _palette_entries(image):
+    entries = np.zeros((256, 4), dtype=np.uint8)
+    entries[:, 3] = 255
+    if image.palette is not None and image.palette.mode == "RGBA":
+        palette = np.array(image.getpalette("RGBA"), dtype=np.uint8).reshape(-1, 4)[:256]
+        entries[:len(palette)] = palette
+        return entries
+    palette = np.array(image.getpalette("RGB") or [], dtype=np.uint8).reshape(-1, 3)[:256]
+    entries[:len(palette), :3] = palette
+    transparency = image.info.get("transparency")
+    if isinstance(transparency, int):
+        entries[transparency, 3] = 0
+    elif isinstance(transparency, bytes):
+        entries[:len(transparency), 3] = np.frombuffer(transparency, dtype=np.uint8)[:256]
+    return entries
+
+# Colors of an (..., 4) RGBA array as uint32 keys, read straight from the buffer with the alpha byte masked off
+def _pack_rgb(rgba):
+    return np.ascontiguousarray(rgba, dtype=np.uint8).view("<u4")[..., 0] & 0xFFFFFF
+
+# One palette shared by every frame of a group, written once as the GIF's global color table.
+# Frames are mapped to it through a table indexed by packed RGB: each color is matched to its nearest
+# entry the first time it is seen, alpha below 128 goes to the transparent entry. The table is 32 MB of
+# virtual memory but zero-filled pages are only backed once a color in them is learned
+class FramePalette:
+    def __init__(self, colors, transparency=None):
+        self.colors = [tuple(color) for color in colors]
+        self.transparency = transparency
+        self.palette_bytes = bytes(channel for color in self.colors for channel in color)
+
+        opaque = [index for index in range(len(self.colors)) if index != transparency]
+        self._opaque_indices = np.array(opaque, dtype=np.uint8)
+        self._opaque_rgb = np.array([self.colors[index] for index in opaque], dtype=np.int32).reshape(-1, 3)
+        self._table = np.zeros(1 << 24, dtype=np.uint16)  # palette index + 1, 0 for a color not seen yet
+        self._learn(np.unique(_pack_rgb(np.pad(self._opaque_rgb, ((0, 0), (0, 1))))))
+
+    # Black and white with a transparent entry, all the dithered frames need
+    @classmethod
+    def fixed(cls):
+        return BilevelPalette()
+
+    # Build the palette from every color used across the frames; more than fit are reduced with median cut.
+    # transparent=True keeps a transparent entry even if no frame has one (delta frames need it)
+    @classmethod
+    def from_frames(cls, frames, max_colors=256, transparent=False):
+        counts = {}
+        for image in frames:
+            if image.mode == "P":
+                entries = _palette_entries(image)
+                colors = [(count, tuple(entries[index])) for count, index in image.getcolors(256)]
+            else:
+                rgba = image.convert("RGBA")
+                colors = rgba.getcolors(rgba.width * rgba.height)
+            for count, (r, g, b, a) in colors:
+                if a < 128:
+                    transparent = True
+                else:
+                    counts[(r, g, b)] = counts.get((r, g, b), 0) + count
+
+        slots = max_colors - 1 if transparent else max_colors
+        if len(counts) <= slots:
+            colors = sorted(counts, key=counts.get, reverse=True)
+        else:
+            strip = Image.new("RGB", (len(counts), 1))
+            strip.putdata(list(counts))
+            quantized = strip.quantize(slots, method=Image.Quantize.MEDIANCUT)
+            palette = quantized.getpalette()[:slots * 3]
+            colors = [tuple(palette[i:i + 3]) for i in range(0, len(palette), 3)]
+        if not colors:
+            # Every frame is fully transparent; colors are still matched to an opaque entry, so keep one
+            colors = [(0, 0, 0)]
+        if transparent:
+            return cls([(255, 255, 255)] + colors, transparency=0)
+        return cls(colors)
+
+    # Add packed colors to the table, each mapped to its nearest opaque palette entry
+    def _learn(self, keys):
+        rgb = np.stack([keys & 255, (keys >> 8) & 255, (keys >> 16) & 255], axis=1).astype(np.int32)
+        values = np.empty(len(keys), dtype=np.uint8)
+        for start in range(0, len(keys), 4096):
+            distances = ((rgb[start:start + 4096, None, :] - self._opaque_rgb[None, :, :]) ** 2).sum(axis=2)
+            values[start:start + 4096] = self._opaque_indices[distances.argmin(axis=1)]
+        self._table[keys] = values.astype(np.uint16) + 1
+
+    # Palette indices for an (..., 4) RGBA array
+    def _lookup(self, rgba):
+        keys = _pack_rgb(rgba)
+        values = self._table[keys]
+        missing = values == 0
+        if missing.any():
+            self._learn(np.unique(keys[missing]))
+            values = self._table[keys]
+        indices = (values - 1).astype(np.uint8)
+        if self.transparency is not None:
+            indices[rgba[..., 3] < 128] = self.transparency
+        return indices
+
+    # Map a frame to this palette. Palette and grayscale frames only map their 256 possible values,
+    # so 1-bit output from the dithering step never goes through RGBA
+    def index_frame(self, image):
+        if image.mode == "P":
+            indices = self._lookup(_palette_entries(image))[np.asarray(image)]
+        elif image.mode in ("1", "L"):
+            gray = np.arange(256, dtype=np.uint8)
+            indices = self._lookup(np.stack([gray, gray, gray, np.full(256, 255, np.uint8)], axis=1))[np.asarray(image.convert("L"))]
+        else:
+            indices = self._lookup(np.asarray(image.convert("RGBA")))
+        return self._palette_frame(indices)
+
+    # P image of palette indices; the transparent entry is set as tRNS, so it converts back to RGBA as it looks
+    def _palette_frame(self, indices):
+        frame = Image.fromarray(indices)
+        frame.putpalette(self.palette_bytes)
+        if self.transparency is not None:
+            frame.info["transparency"] = self.transparency
+        return frame
+
+# The fixed palette: transparent, black, white. Mapping is a threshold on luminance and alpha,
+# for RGBA frames done with Pillow's point tables instead of array lookups
+class BilevelPalette(FramePalette):
+    INDEX_LUT = [1] * 128 + [2] * 128  # luminance -> black or white entry
+    TRANSPARENT_MASK = [255] * 128 + [0] * 128  # alpha -> paste the transparent entry
+
+    def __init__(self):
+        super().__init__([(255, 255, 255), (0, 0, 0), (255, 255, 255)], transparency=0)
+
+    def _lookup(self, rgba):
+        luminance = rgba[..., :3].astype(np.uint32) @ np.array([299, 587, 114], dtype=np.uint32) // 1000
+        indices = np.where(luminance >= 128, 2, 1).astype(np.uint8)
+        indices[rgba[..., 3] < 128] = 0
+        return indices
+
+    def index_frame(self, image):
+        if image.mode in ("P", "1", "L"):
+            return super().index_frame(image)
+        rgba = image.convert("RGBA")
+        frame = rgba.convert("L").point(self.INDEX_LUT)
+        frame.paste(0, mask=rgba.getchannel("A").point(self.TRANSPARENT_MASK))
+        frame.putpalette(self.palette_bytes)
+        frame.info["transparency"] = self.transparency
+        return frame
+
+# Bounding box (left, top, right, bottom) of the True pixels of a mask, or None when there are none
+def _bbox(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    top, bottom = int(rows[0]), int(rows[-1]) + 1
+    columns = np.flatnonzero(mask[top:bottom].any(axis=0))
+    return (int(columns[0]), top, int(columns[-1]) + 1, bottom)
+
+def _union(box, other):
+    if box is None or other is None:
+        return box or other
+    return (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+
+# Shared frame handling of the streaming writers. Frames are mapped to the shared palette if there
+# is one, then a frame identical to the one before only extends its duration. Subclasses write a
+# frame (_write_frame, which also gets the next frame for lookahead) and the end of the file (_finish)
+class AnimationWriter:
+    EXTENSION = None
+
+    def __init__(self, path, duration=250, loop=0, disposal=2, palette=None):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.duration = duration
+        self.loop = loop
+        self.disposal = disposal  # GIF disposal method (0-3); the other formats show frames the same way
+        self.palette = palette  # FramePalette shared by every frame, or None
+        self.size = None
+        self.frame_count = 0
+        self.merged_frames = 0
+        self.encoded_pixels = 0  # pixels inside the written frame rectangles
+        self.pending = None  # (image, raw bytes, duration) of the frame not yet written
+        self.file = open(self.temp_path, "wb")
+
+    # Queue one frame; a frame identical to the previous one only extends its duration
+    def append(self, image):
+        if self.palette is not None:
+            image = self.palette.index_frame(image)
+        if self.size is None:
+            self.size = image.size
+        elif image.size != self.size:
+            raise ValueError(f"Frame {self.frame_count} is {image.size[0]}x{image.size[1]}, expected {self.size[0]}x{self.size[1]}")
+        image = self._composite(image)
+        data = image.tobytes()
+        if self.pending is not None and self.pending[0].mode == image.mode and self.pending[1] == data:
+            self.pending = (self.pending[0], self.pending[1], self.pending[2] + self.duration)
+            self.merged_frames += 1
+            return
+        self._flush(image)
+        self.pending = (image, data, self.duration)
+
+    # The frame as it should look on screen, for formats that need it before the frame is compared
+    def _composite(self, image):
+        return image
+
+    def _flush(self, next_image=None):
+        if self.pending is not None:
+            image, _, duration = self.pending
+            self.pending = None
+            self._write_frame(image, duration, next_image)
+
+    def _write_frame(self, image, duration, next_image):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+    # Called on an error, before the file is closed and removed: release whatever still writes into it
+    def abort(self):
+        pass
+
+    def close(self):
+        self._flush()
+        self._finish()
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.abort()
+            finally:
+                self.file.close()
+                os.remove(self.temp_path)
+        return False
+
+class StreamingGifWriter(AnimationWriter):
+    EXTENSION = ".gif"
+
+    def __init__(self, path, duration=250, loop=0, disposal=2, palette=None, delta=False):
+        if delta and (palette is None or palette.transparency is None):
+            raise ValueError("Delta frames need a shared palette with a transparent entry")
+        super().__init__(path, duration, loop, disposal, palette)
+        self.delta = delta
+        self.canvas = None  # delta mode: palette indices on screen before the pending frame is drawn
+        self.first = None  # delta mode: the first frame, shown again when the animation loops
+
+    # Delta mode compares what is on screen in a full-frame GIF: with disposal 0 or 1 a frame's
+    # transparent pixels show the frame before, with 2 and 3 the screen is cleared between frames
+    def _composite(self, image):
+        if not self.delta:
+            return image
+        target = np.asarray(image)
+        if self.disposal in (0, 1) and self.pending is not None:
+            target = np.where(target == self.palette.transparency, np.asarray(self.pending[0]), target)
+            image = self.palette._palette_frame(target)
+        if self.first is None:
+            self.first = target
+        return image
+
+    # In delta mode the frame after this one decides its rectangle and disposal
+    def _write_frame(self, image, duration, next_image):
+        if self.delta:
+            self._write_delta(image, duration, np.asarray(next_image) if next_image is not None else self.first)
+        else:
+            self._encode_frame(image, duration)
+            self.encoded_pixels += image.width * image.height
+
+    # Write only the rectangle that changed since the previous frame, unchanged pixels transparent.
+    # Frames are kept (disposal 1) unless the next one turns opaque pixels transparent; then this
+    # frame is restored to background (disposal 2) over a rectangle covering those pixels too, since
+    # a transparent pixel cannot erase. After the last frame the next one is the first, for the loop
+    def _write_delta(self, image, duration, next_target):
+        transparency = self.palette.transparency
+        target = np.asarray(image)
+        canvas = self.canvas if self.canvas is not None else np.full(target.shape, transparency, dtype=np.uint8)
+
+        box = _bbox(target != canvas)
+        disposal = 1
+        erase = (next_target == transparency) & (target != transparency)
+        if erase.any():
+            disposal = 2
+            box = _union(box, _bbox(erase))
+        left, top, right, bottom = box or (0, 0, 1, 1)  # a frame that only waited for its erase still needs a pixel
+
+        # Transparent unchanged pixels usually compress better, but noisy rectangles (e.g. the disposal 3
+        # jitter) can compress better as they are; both look the same, so the smaller encoding is written
+        crop = target[top:bottom, left:right]
+        unchanged = (crop == canvas[top:bottom, left:right]) & (crop != transparency)
+        frame = self.palette._palette_frame(np.where(unchanged, transparency, crop).astype(np.uint8))
+        plain = self.palette._palette_frame(np.ascontiguousarray(crop)) if unchanged.any() else None
+        self._encode_frame(frame, duration, offset=(left, top), disposal=disposal, screen=image, alternative=plain)
+        self.encoded_pixels += frame.width * frame.height
+
+        self.canvas = target.copy()
+        if disposal == 2:
+            self.canvas[top:bottom, left:right] = transparency
+
+    # Encode one frame and append it to the file; the first frame also writes the GIF header,
+    # sized to the screen (the whole frame, unless a delta rectangle is written). An alternative
+    # that looks the same on screen is written instead when it encodes smaller
+    def _encode_frame(self, image, duration, offset=(0, 0), disposal=None, screen=None, alternative=None):
+        if self.palette is not None:
+            frame, transparency = image, self.palette.transparency
+        else:
+            frame, transparency = gif_frame(image)
+        # A shared palette is kept whole, it is the global color table for every frame
+        info = {"optimize": self.palette is None, "duration": duration}
+        if transparency is not None:
+            info["transparency"] = transparency
+        if self.frame_count == 0 and self.loop is not None:
+            info["loop"] = self.loop
+
+        # getheader shrinks the palette to the colors in use and remaps info["transparency"] to match
+        header, _ = GifImagePlugin.getheader(frame if screen is None else screen, None, info)
+        params = {"duration": duration, "disposal": self.disposal if disposal is None else disposal}
+        if "transparency" in info:
+            params["transparency"] = info["transparency"]
+
+        if self.frame_count == 0:
+            for chunk in header:
+                self.file.write(chunk)
+        elif self.palette is None:
+            # Without a shared palette, later frames carry their own as a local color table
+            params["include_color_table"] = True
+
+        candidates = [frame] if alternative is None else [frame, alternative]
+        self.file.write(min((b"".join(GifImagePlugin.getdata(candidate, offset, **params)) for candidate in candidates), key=len))
+        self.frame_count += 1
+
+    def _finish(self):
+        self.file.write(b";")  # GIF trailer
+
+# The WebP writer drives Pillow's private animation encoder itself, as the public save_all collects
+# every frame in a list first. The call signatures it uses are the ones Pillow 11 introduced
+WEBP_MIN_PILLOW = (11, 0)
+
+# RuntimeError unless this Pillow can write WebP at all
+def check_webp_support():
+    if not features.check("webp"):
+        raise RuntimeError("WebP output needs Pillow built with WebP support")
+
+# Pillow's private WebP module if its streaming animation encoder is there and new enough, else None
+def _streaming_webp():
+    version = tuple(int(part) for part in PIL.__version__.split(".")[:2])
+    if version < WEBP_MIN_PILLOW:
+        return None
+    try:
+        from PIL import _webp
+    except ImportError:
+        return None
+    return _webp if hasattr(_webp, "WebPAnimEncoder") else None
+
+# Plays of the animation for WebP and APNG, 0 loops forever; loop=None (no GIF loop block) plays once
+def _loop_count(loop):
+    return 1 if loop is None else loop
+
+# Lossless animated WebP. libwebp finds the changed sub-rectangles itself but shows every frame as
+# given, so with disposal 0 or 1 frames are composited over the previous one first, as a GIF shows them.
+# Frames go through Pillow's WebP animation encoder the way its own save_all does, so only the
+# compressed frames are kept until the file is assembled on close. That encoder is private: if it is
+# missing or its signature no longer matches, frames are kept and written with the public save_all
+class StreamingWebPWriter(AnimationWriter):
+    EXTENSION = ".webp"
+
+    def __init__(self, path, duration=250, loop=0, disposal=2, palette=None, method=4, quality=80):
+        check_webp_support()  # before the temp file is created
+        super().__init__(path, duration, loop, disposal, palette)
+        self.webp = _streaming_webp()
+        self.method = method  # effort 0-6
+        self.quality = quality  # for lossless, more effort on the compression
+        self.encoder = None
+        self.timestamp = 0
+        self.frames = None  # (image, duration) of every frame once on the save_all fallback
+
+    def _composite(self, image):
+        image = image.convert("RGBA")
+        if self.disposal in (0, 1) and self.pending is not None:
+            image = Image.alpha_composite(self.pending[0], image)
+        return image
+
+    def _write_frame(self, image, duration, next_image):
+        if self.frames is None and self.encoder is None and self.webp is not None:
+            try:
+                # Transparent background; keyframe spacing as in Pillow's defaults for lossless
+                self.encoder = self.webp.WebPAnimEncoder(image.size, 0, _loop_count(self.loop), False, 9, 17, False, False)
+                self.encoder.add(image.getim(), self.timestamp, True, self.quality, 100, self.method)
+            except (TypeError, AttributeError):
+                self.encoder = None
+        elif self.encoder is not None:
+            self.encoder.add(image.getim(), self.timestamp, True, self.quality, 100, self.method)
+        if self.encoder is None:
+            self.frames = self.frames or []
+            self.frames.append((image, duration))
+        self.timestamp += duration
+        self.frame_count += 1
+        self.encoded_pixels += image.width * image.height
+
+    def _finish(self):
+        if self.frame_count == 0:
+            raise ValueError("No frames to write")
+        if self.encoder is not None:
+            self.encoder.add(None, self.timestamp, True, self.quality, 100, 0)  # end of the last frame
+            self.file.write(self.encoder.assemble("", "", ""))
+            return
+        (first, _), *rest = self.frames
+        first.save(self.file, format="WEBP", save_all=True, append_images=[image for image, _ in rest],
+                   duration=[duration for _, duration in self.frames], loop=_loop_count(self.loop),
+                   background=(0, 0, 0, 0), lossless=True, quality=self.quality, method=self.method)
+
+    def abort(self):
+        self.encoder = None
+        self.frames = None
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+# (type, data) of every chunk in a PNG file
+def _png_chunks(png):
+    chunks = []
+    position = 8  # after the signature
+    while position < len(png):
+        length, chunk_type = struct.unpack(">I4s", png[position:position + 8])
+        chunks.append((chunk_type, png[position + 8:position + 8 + length]))
+        position += 12 + length
+    return chunks
+
+# APNG. Each frame is encoded by Pillow's PNG encoder and its image data moved into the animation
+# chunks; frames must share the PNG header, so they are RGBA, or palette indices with a shared palette.
+# Disposal and blending map onto APNG's own (over the previous frame, like GIF). The frame count in
+# the animation header is only known at the end and is patched in on close
+class StreamingApngWriter(AnimationWriter):
+    EXTENSION = ".png"
+    DISPOSE_OPS = {0: 0, 1: 0, 2: 1, 3: 2}  # GIF disposal -> APNG none, background, previous
+    BLEND_OVER = 1
+
+    def __init__(self, path, duration=250, loop=0, disposal=2, palette=None, compress_level=6):
+        super().__init__(path, duration, loop, disposal, palette)
+        self.compress_level = compress_level
+        self.header = None
+        self.actl_offset = None
+        self.sequence = 0
+
+    def _write_frame(self, image, duration, next_image):
+        frame = image if self.palette is not None else image.convert("RGBA")
+        buffer = io.BytesIO()
+        frame.save(buffer, format="PNG", compress_level=self.compress_level)
+        chunks = _png_chunks(buffer.getvalue())
+        header = [(chunk_type, data) for chunk_type, data in chunks if chunk_type not in (b"IDAT", b"IEND")]
+
+        if self.frame_count == 0:
+            self.header = header[0][1]
+            self.file.write(b"\x89PNG\r\n\x1a\n")
+            self.file.write(_png_chunk(b"IHDR", self.header))
+            self.actl_offset = self.file.tell()
+            self.file.write(_png_chunk(b"acTL", struct.pack(">II", 0, _loop_count(self.loop))))
+            for chunk_type, data in header[1:]:  # palette, transparency
+                self.file.write(_png_chunk(chunk_type, data))
+        elif header[0][1] != self.header:
+            raise ValueError(f"Frame {self.frame_count} does not match the first frame's PNG header (mode or palette changed)")
+
+        # The delay is a 16-bit fraction of a second, long merged frames drop precision to fit
+        delay, denominator = duration, 1000
+        while delay > 0xFFFF:
+            delay, denominator = delay // 10, denominator // 10
+        self.file.write(_png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._next_sequence(), frame.width, frame.height, 0, 0,
+                                                        delay, denominator, self.DISPOSE_OPS.get(self.disposal, 0), self.BLEND_OVER)))
+        for chunk_type, data in chunks:
+            if chunk_type == b"IDAT":
+                # The first frame is the default image, later frames move their data into fdAT chunks
+                if self.frame_count == 0:
+                    self.file.write(_png_chunk(b"IDAT", data))
+                else:
+                    self.file.write(_png_chunk(b"fdAT", struct.pack(">I", self._next_sequence()) + data))
+        self.frame_count += 1
+        self.encoded_pixels += frame.width * frame.height
+
+    def _next_sequence(self):
+        self.sequence += 1
+        return self.sequence - 1
+
+    def _finish(self):
+        if self.frame_count == 0:
+            raise ValueError("No frames to write")
+        self.file.write(_png_chunk(b"IEND", b""))
+        self.file.seek(self.actl_offset)
+        self.file.write(_png_chunk(b"acTL", struct.pack(">II", self.frame_count, _loop_count(self.loop))))
+        self.file.seek(0, os.SEEK_END)
+
+# Raw frame stack for downstream tools: an .npz with one array per frame (frame_00000, ...; palette
+# indices with a shared palette, else RGBA), durations in ms, and the palette, transparency, loop and
+# disposal. Frames are written into the archive as they come; deflate defaults to its fastest level,
+# the stack is an intermediate for other tools rather than a file to share
+class FrameStackWriter(AnimationWriter):
+    EXTENSION = ".npz"
+
+    def __init__(self, path, duration=250, loop=0, disposal=2, palette=None, compress_level=1):
+        super().__init__(path, duration, loop, disposal, palette)
+        self.archive = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED, compresslevel=compress_level)
+        self.durations = []
+
+    def _write_array(self, name, array):
+        with self.archive.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+    def _write_frame(self, image, duration, next_image):
+        frame = image if self.palette is not None else image.convert("RGBA")
+        self._write_array(f"frame_{self.frame_count:05d}", np.asarray(frame))
+        self.durations.append(duration)
+        self.frame_count += 1
+        self.encoded_pixels += frame.width * frame.height
+
+    def _finish(self):
+        self._write_array("durations", np.array(self.durations, dtype=np.int32))
+        self._write_array("loop", np.array(-1 if self.loop is None else self.loop))
+        self._write_array("disposal", np.array(self.disposal))
+        if self.palette is not None:
+            self._write_array("palette", np.array(self.palette.colors, dtype=np.uint8))
+            self._write_array("transparency", np.array(-1 if self.palette.transparency is None else self.palette.transparency))
+        self.archive.close()
+
+    # Close the archive while its file is still open, otherwise ZipFile's finalizer writes to a closed file
+    def abort(self):
+        self.archive.close()
+
+# Output backends of the animation stitcher, by name
+ANIMATION_WRITERS = {
+    "gif": StreamingGifWriter,
+    "webp": StreamingWebPWriter,
+    "apng": StreamingApngWriter,
+    "npz": FrameStackWriter,
+}
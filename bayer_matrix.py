@@ -0,0 +1,28 @@
+from functools import lru_cache
+import numpy as np
+
+## Bayer threshold maps shared by the ordered dithering algorithms
+## kept out of the algorithm modules so the registry can load each of them on its own
+
+BAYER_SIZES = (2, 4, 8, 16)
+
+# Bayer index matrix of size n (a power of two), built recursively from the 2x2 case
+def bayer_matrix(n):
+    if n not in BAYER_SIZES:
+        raise ValueError(f"Bayer matrix size must be one of {BAYER_SIZES}, got {n}")
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while matrix.shape[0] < n:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+# Threshold map (0-255 scale) tiled to cover an image of the given (height, width)
+# cached per size and shape since every tile in a run usually has the same dimensions
+@lru_cache(maxsize=16)
+def bayer_threshold_map(n, shape):
+    threshold_map = bayer_matrix(n) / float(n * n) * 255
+    height, width = shape
+    reps = (-(-height // n), -(-width // n))
+    tiled = np.tile(threshold_map, reps)[:height, :width]
+    tiled.setflags(write=False)
+    return tiled
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import PIL
+from animation_writers import ANIMATION_WRITERS
+from benchmark_common import git_commit
+from stitchImages_toGIF import PALETTE_MODES, create_animation, group_images, hex_to_rgba
+
+## animation backend benchmark: stitches every group of an input folder with each output
+## backend and palette mode through the same grouping, ping-pong and jitter code as
+## stitchImages_toGIF.py, and reports encode time and file size per backend; with --delta
+## GIF is also run with delta frames, which shows the real size gain of --delta
+
+def main(args):
+    groups = group_images(args.input_folder)
+    if args.groups:
+        groups = {prefix: files for prefix, files in groups.items() if prefix in args.groups}
+    if not groups:
+        print(f"No image groups found in {args.input_folder}")
+        return
+    frame_count = sum(len(files) for files in groups.values())
+    print(f"Benchmarking {len(groups)} groups ({frame_count} images) from {args.input_folder}")
+
+    options = {"ping_pong": args.ping_pong, "duration": args.duration, "disposal": args.disposal,
+               "bg_color": hex_to_rgba(args.bg_color), "read_threads": args.read_threads, "progress": False}
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for palette_mode in args.palettes:
+            # Delta frames are GIF-only and need a global or fixed palette
+            runs = [(output_format, False) for output_format in args.formats]
+            if args.delta and "gif" in args.formats and palette_mode != "adaptive":
+                runs.append(("gif", True))
+            for output_format, delta in runs:
+                label = output_format + ("-delta" if delta else "")
+                total_seconds = 0.0
+                total_bytes = 0
+                for prefix, files in groups.items():
+                    output_path = os.path.join(temp_dir, prefix + ANIMATION_WRITERS[output_format].EXTENSION)
+                    best = None
+                    for _ in range(args.repeats):
+                        random.seed(0)  # the same disposal 3 jitter for every backend
+                        start = time.perf_counter()
+                        stats = create_animation(files, output_path, output_format, palette_mode=palette_mode, delta=delta, **options)
+                        seconds = time.perf_counter() - start
+                        best = seconds if best is None else min(best, seconds)
+                    total_seconds += best
+                    total_bytes += stats["bytes"]
+                    results.append({
+                        "format": label,
+                        "palette": palette_mode,
+                        "group": prefix,
+                        "images": len(files),
+                        "frames": stats["frames"],
+                        "seconds": round(best, 4),
+                        "bytes": stats["bytes"],
+                    })
+                print(f"{label:<9} {palette_mode:<9} {total_seconds:8.2f} s {frame_count / total_seconds:8.1f} images/s {total_bytes:>12} bytes")
+
+    # Sizes and times relative to GIF with the same palette mode
+    totals = {}
+    for result in results:
+        key = (result["format"], result["palette"])
+        seconds, size = totals.get(key, (0.0, 0))
+        totals[key] = (seconds + result["seconds"], size + result["bytes"])
+    if "gif" in args.formats:
+        print("Relative to gif:")
+        for (output_format, palette_mode), (seconds, size) in totals.items():
+            gif_seconds, gif_size = totals[("gif", palette_mode)]
+            if output_format != "gif":
+                print(f"  {output_format:<9} {palette_mode:<9} time {seconds / gif_seconds:5.2f}x  size {size / gif_size:5.2f}x")
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "input_folder": args.input_folder,
+            "ping_pong": args.ping_pong,
+            "disposal": args.disposal,
+            "delta": args.delta,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output_json}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare encode time and file size of the animation output backends on a folder of frames")
+    parser.add_argument("input_folder", help="Folder of PNG frames named <group>_<index>.png, as for stitchImages_toGIF.py")
+    parser.add_argument("--formats", nargs="+", choices=list(ANIMATION_WRITERS), default=list(ANIMATION_WRITERS), help="Backends to run (default: all)")
+    parser.add_argument("--palettes", nargs="+", choices=PALETTE_MODES, default=["adaptive", "fixed"], help="Palette modes to run (default: adaptive fixed)")
+    parser.add_argument("--groups", nargs="+", default=None, help="Only these group prefixes (default: all)")
+    parser.add_argument("--ping-pong", action="store_true", help="Enable ping-pong looping")
+    parser.add_argument("--duration", type=int, default=250, help="Duration of each frame in milliseconds (default: 250)")
+    parser.add_argument("--disposal", type=int, default=2, help="Frame disposal method (default: 2)")
+    parser.add_argument("--bg-color", type=str, default="#000000", help="Background color for the disposal 3 jitter (default: #000000)")
+    parser.add_argument("--read-threads", type=int, default=4, help="Threads decoding frames ahead of the encoder (default: 4)")
+    parser.add_argument("--delta", action="store_true", help="Also run GIF with delta frames for the global and fixed palettes")
+    parser.add_argument("--repeats", type=int, default=1, help="Repeats per group and backend, the best time is reported (default: 1)")
+    parser.add_argument("--output-json", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,74 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from imagery_input import compute_area_bboxes, CONTOUR_COLUMNS
+
+## compares the vectorized area-mode bounding boxes against the original
+## per-row, per-column loop from extractBingMapsImagery.process_area_mode
+
+# Synthetic FCC-style contour rows: 360 "lat,lon" vertices around a random center, a few blanked out
+def make_contour_frame(rows, missing_fraction=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack([rng.uniform(25, 49, rows), rng.uniform(-124, -67, rows)])
+    radii = rng.uniform(0.05, 1.0, (rows, 1)) * rng.uniform(0.8, 1.2, (rows, 360))
+    bearings = np.deg2rad(np.arange(360))
+    latitudes = np.round(centers[:, [0]] + radii * np.cos(bearings), 6)
+    longitudes = np.round(centers[:, [1]] + radii * np.sin(bearings), 6)
+
+    cells = np.char.add(np.char.add(latitudes.astype(str), ","), longitudes.astype(str)).astype(object)
+    cells[rng.random((rows, 360)) < missing_fraction] = ""
+    df = pd.DataFrame(cells, columns=CONTOUR_COLUMNS)
+    df.insert(0, "unique_id", np.arange(rows))
+    df.insert(1, "angle", 0)
+    return df
+
+# The loop this replaces, kept verbatim for the comparison
+def legacy_bboxes(df):
+    bboxes = []
+    for index, row in df.iterrows():
+        min_latitude = 90
+        max_latitude = -90
+        min_longitude = 180
+        max_longitude = -180
+        for i in range(360):
+            if ',' in row[str(i)]:
+                try:
+                    latitude, longitude = map(float, row[str(i)].split(','))
+                    min_latitude = min(min_latitude, latitude)
+                    max_latitude = max(max_latitude, latitude)
+                    min_longitude = min(min_longitude, longitude)
+                    max_longitude = max(max_longitude, longitude)
+                except ValueError:
+                    pass
+        bboxes.append((min_latitude, min_longitude, max_latitude, max_longitude))
+    return np.array(bboxes, dtype=float)
+
+def main(args):
+    print(f"Generating {args.rows} synthetic contour rows...")
+    df = make_contour_frame(args.rows)
+
+    start = time.perf_counter()
+    vectorized = compute_area_bboxes(df)
+    vectorized_time = time.perf_counter() - start
+    print(f"vectorized: {vectorized_time:.2f} s ({args.rows / vectorized_time:,.0f} rows/s)")
+
+    # The old loop is slow, so optionally time it on a prefix and extrapolate
+    legacy_rows = min(args.legacy_rows or args.rows, args.rows)
+    start = time.perf_counter()
+    legacy = legacy_bboxes(df.iloc[:legacy_rows])
+    legacy_time = (time.perf_counter() - start) * args.rows / legacy_rows
+    note = "" if legacy_rows == args.rows else f" (extrapolated from {legacy_rows} rows)"
+    print(f"legacy loop: {legacy_time:.2f} s{note}")
+    print(f"speedup: {legacy_time / vectorized_time:.1f}x")
+
+    if not np.array_equal(legacy, vectorized[:legacy_rows]):
+        raise SystemExit("Bounding boxes differ from the legacy loop")
+    print("Bounding boxes match the legacy loop.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark area-mode bounding box computation")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of synthetic rows (default: 100000)")
+    parser.add_argument("--legacy-rows", type=int, default=None, help="Only time the legacy loop on this many rows and extrapolate")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import time
+import numpy as np
+
+## helpers shared by the benchmark scripts: synthetic inputs, best-of timing and the
+## commit a result was measured at
+
+# Smooth gradients plus noise, roughly like a grayscale aerial tile
+def make_grayscale(size, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32)
+    field = np.sin(x / 23.0) * np.cos(y / 41.0) + rng.normal(0, 0.3, (size, size))
+    field = (field - field.min()) / (field.max() - field.min()) * 255
+    return field.astype(np.uint8)
+
+# Run function repeats times; returns (fastest time in seconds, result of the last run)
+def best_of(function, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import gc
+import io
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import psutil
+import PIL
+from PIL import Image
+import dithering_engine
+from benchmark_common import git_commit
+from dithering_engine import DITHER_ALGORITHMS, ALGORITHM_OPTIONS, OUTPUT_MODES, load_algorithm
+from imagery_output import ImageEncoder, OUTPUT_FORMATS
+
+## benchmark suite for every registered dithering algorithm
+## times each stage of the engine (resize, dither, transparency, upscale, encode) on
+## deterministic synthetic aerial-like tiles, records the peak resident memory of a full run and
+## writes the results to JSON; --compare flags stages that got slower than a previous run
+
+STAGES = ("resize", "dither", "transparency", "upscale", "encode")
+
+# Deterministic aerial-like RGB tile: rolling terrain, field parcels, a road grid and fine texture.
+# Features are placed in relative coordinates, so every size shows the same scene at a different resolution
+def make_aerial_image(size, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+
+    terrain = sum(np.sin(2 * np.pi * (fx * x + fy * y) + phase)
+                  for fx, fy, phase in rng.uniform((0.5, 0.5, 0), (3, 3, 2 * np.pi), (4, 3)))
+    parcels = rng.uniform(-1, 1, (12, 12))[(y * 12).astype(int), (x * 12).astype(int)]
+    roads = (((x * 6) % 1 < 0.012) | ((y * 4 + x * 0.5) % 1 < 0.01)).astype(np.float32)
+    texture = np.random.default_rng(seed + size).normal(0, 0.35, (size, size))
+
+    field = terrain * 0.3 + parcels + texture
+    field = (field - field.min()) / (field.max() - field.min())
+    field = np.where(roads > 0, 0.9, field)
+    rgb = np.stack([field * 0.85, field * 0.95 + 0.03, field * 0.7], axis=-1)
+    return Image.fromarray((np.clip(rgb, 0, 1) * 255).astype(np.uint8), 'RGB')
+
+# Run one image through the engine stage by stage, returning (timings, output size in bytes)
+def run_stages(algorithm, name, image, final_size, output_mode, encoder, output_path, aspect_ratio=None):
+    options = ALGORITHM_OPTIONS.get(name, {})
+    timings = {}
+
+    def timed(stage, function, *function_args):
+        start = time.perf_counter()
+        result = function(*function_args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    gray = timed("resize", dithering_engine.prepare_grayscale, image, aspect_ratio)
+    dithered = timed("dither", lambda: algorithm.dither(gray, **options))
+    # Same stage order as the engine: RGBA upscales the single channel first, the palette path thresholds first
+    if output_mode == "palette":
+        indexed = timed("transparency", dithering_engine.palette_transparency, dithered)
+        final = timed("upscale", dithering_engine.upscale, indexed, final_size, aspect_ratio)
+    else:
+        upscaled = timed("upscale", dithering_engine.upscale, dithered.convert('L'), final_size, aspect_ratio)
+        final = timed("transparency", dithering_engine.rgba_transparency, upscaled)
+    timed("encode", encoder.save, final, output_path)
+    return timings, os.path.getsize(output_path)
+
+# Fastest time per stage over repeats runs of run_stages
+def best_stage_timings(function, repeats):
+    best = None
+    for _ in range(repeats):
+        timings, output_bytes = function()
+        best = timings if best is None else {stage: min(best[stage], timings[stage]) for stage in best}
+    return best, output_bytes
+
+# glibc keeps freed memory mapped, so without a trim a run reuses the pages of the previous one and its RSS barely moves
+_libc = ctypes.CDLL(ctypes.util.find_library("c")) if ctypes.util.find_library("c") else None
+_malloc_trim = getattr(_libc, "malloc_trim", None)
+
+# Peak resident memory of one full run above the RSS before it, sampled every millisecond on a
+# background thread. Unlike tracemalloc this includes Pillow's C-side image buffers
+def peak_memory(function, interval=0.001):
+    process = psutil.Process()
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+    baseline = process.memory_info().rss
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, process.memory_info().rss)
+            done.wait(interval)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        function()
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak, process.memory_info().rss) - baseline
+
+# Results from before aspect_ratio was recorded timed a no-op resize, they never match a run that has one
+def result_key(result):
+    return (result["algorithm"], result["size"], tuple(result["final_size"]), result["output_mode"], result.get("aspect_ratio"))
+
+# Print stages that are more than threshold times slower than in the baseline file; returns how many regressed
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)["results"]}
+    regressions = 0
+    print(f"Comparing with {baseline_path} (regression threshold {threshold:.2f}x)")
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None:
+            continue
+        for stage in ("total",) + STAGES:
+            before = previous["total_s"] if stage == "total" else previous["stages_s"].get(stage)
+            after = result["total_s"] if stage == "total" else result["stages_s"][stage]
+            # Ignore sub-millisecond stages, their timings are mostly noise
+            if before and max(before, after) > 0.001 and after / before > threshold:
+                regressions += 1
+                print(f"  REGRESSION {result['algorithm']} {result['size']}px {result['output_mode']} {stage}: "
+                      f"{before * 1000:.1f} ms -> {after * 1000:.1f} ms ({after / before:.2f}x)")
+    print(f"{regressions} regressions found")
+    return regressions
+
+def main(args):
+    algorithms = args.algorithms or list(DITHER_ALGORITHMS)
+    encoder = ImageEncoder(args.output_format)
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "output" + encoder.extension)
+        for size in args.sizes:
+            image = make_aerial_image(size)
+            for name in algorithms:
+                algorithm = load_algorithm(name)
+                for final_size in args.final_sizes or [algorithm.FINAL_SIZE[0]]:
+                    for output_mode in args.output_modes:
+                        run = lambda: run_stages(algorithm, name, image, (final_size, final_size), output_mode, encoder, output_path, args.aspect_ratio)
+                        # The engine's progress prints are not part of what is measured
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            run()  # warm up caches (threshold maps, blue noise) so they are not timed
+                            stages, output_bytes = best_stage_timings(run, args.repeats)
+                            peak = peak_memory(run) if not args.no_memory else None
+
+                        total = sum(stages.values())
+                        results.append({
+                            "algorithm": name,
+                            "size": size,
+                            "final_size": [final_size, final_size],
+                            "output_mode": output_mode,
+                            "aspect_ratio": args.aspect_ratio,
+                            "stages_s": {stage: round(seconds, 6) for stage, seconds in stages.items()},
+                            "total_s": round(total, 6),
+                            "megapixels_per_s": round(size * size / 1e6 / total, 3),
+                            "peak_rss_bytes": peak,
+                            "output_bytes": output_bytes,
+                        })
+                        stage_text = " ".join(f"{stage}={stages[stage] * 1000:.1f}" for stage in STAGES)
+                        memory_text = f" peak={peak / 1e6:.1f}MB" if peak is not None else ""
+                        print(f"{name:<20} {size:>5}px -> {final_size:>5}px {output_mode:<7} total={total * 1000:8.1f} ms ({stage_text}){memory_text}")
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeats": args.repeats,
+            "output_format": args.output_format,
+        },
+        "results": results,
+    }
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output_json}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every dithering algorithm stage by stage on synthetic aerial tiles")
+    parser.add_argument("--algorithms", nargs="+", choices=sorted(DITHER_ALGORITHMS), default=None, help="Algorithms to run (default: all)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024, 2048, 4096], help="Square input sizes (default: 256 512 1024 2048 4096)")
+    parser.add_argument("--final-sizes", type=int, nargs="+", default=None, help="Square output sizes (default: each algorithm's FINAL_SIZE)")
+    parser.add_argument("--output-modes", nargs="+", choices=OUTPUT_MODES, default=list(OUTPUT_MODES), help="Output modes to run (default: all)")
+    parser.add_argument("--output-format", choices=sorted(OUTPUT_FORMATS), default="png", help="Encoder used for the encode stage (default: png)")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeats per measurement, the best time per stage is reported (default: 3)")
+    parser.add_argument("--aspect-ratio", type=float, default=0.75, help="Aspect ratio the engine resizes to before dithering, so the resize stage does real work (default: 0.75)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory run")
+    parser.add_argument("--output-json", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, metavar="BASELINE_JSON", help="Compare with a previous --output-json file and exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression (default: 1.25)")
+    args = parser.parse_args()
+    main(args)
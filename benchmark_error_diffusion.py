@@ -0,0 +1,27 @@
+import argparse
+from PIL import Image
+from benchmark_common import best_of, make_grayscale
+from process_imagery_errorDiffusion import error_diffuse, KERNELS
+
+## throughput of the NumPy error diffusion kernels in process_imagery_errorDiffusion
+## against Pillow's built-in Floyd-Steinberg (convert('1')), in megapixels per second
+
+def main(args):
+    for size in args.sizes:
+        pixels = make_grayscale(size)
+        image = Image.fromarray(pixels, 'L')
+        megapixels = size * size / 1e6
+
+        baseline, _ = best_of(lambda: image.convert('1'), args.repeats)
+        print(f"{size}x{size} ({megapixels:.2f} MP)")
+        print(f"  {'pillow floyd-steinberg':<28} {baseline * 1000:9.1f} ms {megapixels / baseline:9.1f} MP/s")
+        for kernel in KERNELS:
+            elapsed, _ = best_of(lambda: error_diffuse(pixels, kernel), args.repeats)
+            print(f"  {kernel:<28} {elapsed * 1000:9.1f} ms {megapixels / elapsed:9.1f} MP/s ({elapsed / baseline:.0f}x the pillow time)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NumPy error diffusion kernels against Pillow's Floyd-Steinberg")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1920], help="Square image sizes to test (default: 500 1920)")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeats per measurement, best is reported (default: 3)")
+    args = parser.parse_args()
+    main(args)
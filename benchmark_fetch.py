@@ -0,0 +1,110 @@
+import argparse
+import json
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from tqdm import tqdm
+from bing_imagery_client import BingImageryClient, RateLimiter
+from imagery_input import iter_point_rows, iter_area_rows
+from imagery_retry import add_retry_arguments, create_throttle
+from bing_stub_server import start_stub_server, add_stub_arguments, settings_from_args
+
+## fetch throughput benchmark: replays the requests an input CSV would make
+## against the local stub server (or any --base-url) and reports images/sec and latency
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# Build the (url, params) pairs the fetch scripts would request for this input
+def build_requests(client, args):
+    requests_to_make = []
+    if args.mode == "zoom":
+        df = pd.read_csv(args.input_file, usecols=['city', 'lon', 'lat'], nrows=args.limit)
+        for city, lon, lat in df[['city', 'lon', 'lat']].drop_duplicates().itertuples(index=False):
+            for zoom_level in range(5, 20):
+                requests_to_make.append(client.point_request(args.map_style, lat, lon, zoom_level, args.map_size))
+        return requests_to_make
+
+    if args.mode == "point":
+        for row in islice(iter_point_rows(args.input_file), args.limit):
+            angle = int(round(float(row.angle) % 360))
+            requests_to_make.append(client.point_request(args.map_style, row.center_latitude, row.center_longitude, args.zoom_level, args.map_size, angle))
+    else:
+        for row in islice(iter_area_rows(args.input_file), args.limit):
+            angle = int(round(float(row.angle) % 360))
+            requests_to_make.append(client.area_request(args.map_style, row.min_latitude, row.min_longitude, row.max_latitude, row.max_longitude, args.map_size, angle))
+    return requests_to_make
+
+def main(args):
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_stub_server(settings_from_args(args))
+        print(f"Started stub imagery server at {base_url}")
+
+    rate_limiter = RateLimiter(args.max_rps) if args.max_rps else None
+    client = BingImageryClient(args.api_key, base_url=base_url, pool_size=args.concurrency, rate_limiter=rate_limiter, throttle=create_throttle(args, rate_limiter))
+
+    requests_to_make = build_requests(client, args)
+    print(f"Replaying {len(requests_to_make)} requests with concurrency {args.concurrency}")
+
+    def fetch(request):
+        response = client.get(*request)
+        return response.status_code, response.elapsed, len(response.content)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(tqdm(executor.map(fetch, requests_to_make), total=len(requests_to_make)))
+    wall_time = time.perf_counter() - start
+
+    latencies = sorted(elapsed for status, elapsed, _ in results if status == 200)
+    status_counts = {}
+    for status, _, _ in results:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+
+    report = {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "ok": len(latencies),
+        "status_counts": status_counts,
+        "wall_time_s": round(wall_time, 3),
+        "images_per_s": round(len(latencies) / wall_time, 2) if wall_time > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "bytes_transferred": sum(size for _, _, size in results),
+    }
+
+    print(client.summary())
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output_json}")
+
+    client.close()
+    if server is not None:
+        server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Bing imagery fetch throughput against the local stub server")
+    parser.add_argument("input_file", help="Path to the input CSV file")
+    parser.add_argument("--mode", choices=["area", "point", "zoom"], required=True, help="Which fetch script's requests to replay (zoom = extractImageryByZoomLevels)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of parallel requests (default: 8)")
+    parser.add_argument("--max-rps", type=float, default=None, help="Maximum requests per second across all workers")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N rows of the input")
+    parser.add_argument("--base-url", default=None, help="Imagery endpoint to hit instead of starting the local stub")
+    parser.add_argument("--api-key", default="stub-key", help="API key to send (default: stub-key, accepted by the stub)")
+    parser.add_argument("--map-style", default="Aerial", help="Bing Maps style (e.g., Aerial)")
+    parser.add_argument("--map-size", default="500,500", help="Map size in pixels (e.g., 500,500)")
+    parser.add_argument("--zoom-level", type=int, default=15, help="Bing Maps zoom level (only for point mode)")
+    parser.add_argument("--output-json", default=None, help="Also write the results to this JSON file")
+    add_retry_arguments(parser)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    main(args)
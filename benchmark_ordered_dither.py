@@ -0,0 +1,47 @@
+import argparse
+import numpy as np
+from benchmark_common import best_of, make_grayscale
+from process_imagery_ordered import bayer_threshold_map
+
+## compares the vectorized Bayer thresholding in process_imagery_ordered against
+## the per-pixel Python loop it replaced (applied to the grayscale data)
+
+def loop_dither(pixels):
+    threshold_map = np.array([[0, 8, 2, 10],
+                              [12, 4, 14, 6],
+                              [3, 11, 1, 9],
+                              [15, 7, 13, 5]])
+    threshold_map = threshold_map / 16.0 * 255
+    pixels = pixels.copy()
+    for y in range(pixels.shape[0]):
+        for x in range(pixels.shape[1]):
+            i = x % 4
+            j = y % 4
+            pixels[y, x] = 255 if pixels[y, x] > threshold_map[j, i] else 0
+    return pixels
+
+def vectorized_dither(pixels, bayer_size=4):
+    return np.where(pixels > bayer_threshold_map(bayer_size, pixels.shape), 255, 0).astype(np.uint8)
+
+def main(args):
+    pixels = make_grayscale(args.size)
+
+    loop_time, loop_result = best_of(lambda: loop_dither(pixels), 1)
+    vector_time, vector_result = best_of(lambda: vectorized_dither(pixels), args.repeats)
+    print(f"{args.size}x{args.size} grayscale, 4x4 Bayer")
+    print(f"  per-pixel loop: {loop_time * 1000:10.1f} ms")
+    print(f"  vectorized:     {vector_time * 1000:10.3f} ms ({loop_time / vector_time:,.0f}x faster)")
+    if not np.array_equal(loop_result, vector_result):
+        raise SystemExit("Vectorized output differs from the per-pixel loop")
+    print("  outputs are pixel-identical")
+
+    for bayer_size in (2, 8, 16):
+        elapsed, _ = best_of(lambda: vectorized_dither(pixels, bayer_size), args.repeats)
+        print(f"  vectorized {bayer_size}x{bayer_size}: {elapsed * 1000:8.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized Bayer ordered dithering")
+    parser.add_argument("--size", type=int, default=500, help="Width and height of the synthetic image (default: 500)")
+    parser.add_argument("--repeats", type=int, default=20, help="Repeats for the vectorized timings, best is reported (default: 20)")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,165 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from imagery_cache import request_key
+from imagery_retry import ThrottleController, is_retryable_status, parse_retry_after
+
+## shared HTTP client for the Bing Maps static imagery scripts
+## (extractBingMapsImagery.py, extractImageryByZoomLevels.py)
+
+BING_IMAGERY_URL = "https://dev.virtualearth.net/REST/v1/Imagery/Map/"
+
+# Token bucket shared by all fetch workers so that concurrent requests stay under the API quota
+class RateLimiter:
+    def __init__(self, max_rps, burst=None):
+        self.rate = float(max_rps)
+        self.capacity = float(burst if burst is not None else max(1, max_rps))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def set_rate(self, max_rps):
+        with self.lock:
+            self.rate = float(max_rps)
+
+# Result of a single imagery request, including how long it took
+class ImageryResponse:
+    def __init__(self, status_code, content, headers, elapsed, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.elapsed = elapsed  # seconds from sending the request to reading the full body
+        self.from_cache = from_cache
+
+class BingImageryClient:
+    def __init__(self, api_key, base_url=BING_IMAGERY_URL, pool_size=10, timeout=60, rate_limiter=None, cache=None, cache_only=False, refresh=False, throttle=None):
+        self.api_key = api_key
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+
+        # Retry policy and backoff shared by every worker using this client
+        self.throttle = throttle or ThrottleController(rate_limiter=rate_limiter)
+
+        # Optional imagery_cache.ResponseCache; cache_only never touches the network,
+        # refresh always re-downloads and overwrites the cached entry
+        self.cache = cache
+        self.cache_only = cache_only
+        self.refresh = refresh
+
+        # One keep-alive pool per host, sized to the number of fetch workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.bytes_received = 0
+        self.total_elapsed = 0.0
+
+    # Build the request for a map centered on a point at a given zoom level
+    def point_request(self, map_style, center_latitude, center_longitude, zoom_level, map_size, angle=None):
+        url = f"{self.base_url}{map_style}/{center_latitude},{center_longitude}/{zoom_level}"
+        params = {"mapSize": map_size, "format": "png"}
+        if angle is not None:
+            params["dir"] = angle  # camera rotation angle
+        return url, params
+
+    # Build the request for a map covering a bounding box
+    def area_request(self, map_style, min_latitude, min_longitude, max_latitude, max_longitude, map_size, angle=None):
+        url = f"{self.base_url}{map_style}"
+        params = {
+            "mapArea": f"{min_latitude},{min_longitude},{max_latitude},{max_longitude}",
+            "mapSize": map_size,
+            "format": "png",
+        }
+        if angle is not None:
+            params["dir"] = angle  # camera rotation angle
+        return url, params
+
+    def get(self, url, params):
+        if self.cache_only and self.cache is None:
+            return ImageryResponse(None, b"no cache to read (--cache-only)", {}, 0.0)
+        cache_key = None
+        if self.cache is not None:
+            host = None if self.base_url == BING_IMAGERY_URL else self.base_url
+            cache_key = request_key(url[len(self.base_url):], params, host)
+            if not self.refresh:
+                content = self.cache.get(cache_key)
+                if content is not None:
+                    return ImageryResponse(200, content, {}, 0.0, from_cache=True)
+            if self.cache_only:
+                return ImageryResponse(None, b"not in cache (--cache-only)", {}, 0.0)
+
+        # Retry throttled (429), server (5xx) and network failures; other 4xx are returned as-is
+        for attempt in range(1, self.throttle.max_attempts + 1):
+            self.throttle.wait()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                response = self._send(url, params)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.throttle.max_attempts:
+                    raise
+                time.sleep(self.throttle.record_failure())
+                continue
+
+            if not is_retryable_status(response.status_code):
+                break
+            if attempt == self.throttle.max_attempts:
+                self.throttle.record_failure()
+                break
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = self.throttle.record_failure(retry_after, throttled=response.status_code == 429)
+            if response.status_code != 429:
+                time.sleep(delay)
+
+        if response.status_code == 200:
+            self.throttle.record_success()
+            if cache_key is not None:
+                self.cache.put(cache_key, response.content)
+
+        return response
+
+    def _send(self, url, params):
+        start = time.perf_counter()
+        response = self.session.get(url, params={**params, "key": self.api_key}, timeout=self.timeout)
+        content = response.content
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.request_count += 1
+            self.bytes_received += len(content)
+            self.total_elapsed += elapsed
+
+        return ImageryResponse(response.status_code, content, response.headers, elapsed)
+
+    def summary(self):
+        if self.request_count == 0:
+            text = "No imagery requests made."
+        else:
+            average_ms = self.total_elapsed / self.request_count * 1000
+            text = f"{self.request_count} requests, {self.bytes_received / 1e6:.1f} MB received, {average_ms:.0f} ms average per request"
+        text += f"; {self.throttle.summary()}"
+        if self.cache is not None:
+            text += f"; {self.cache.summary()}"
+        return text
+
+    def close(self):
+        self.session.close()
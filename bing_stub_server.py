@@ -0,0 +1,133 @@
+import argparse
+import io
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import numpy as np
+from PIL import Image
+
+## local stand-in for the Bing Maps static imagery endpoints (Imagery/Map)
+## serves synthetic PNGs of the requested mapSize with configurable latency and failures,
+## so the fetch path can be measured without an API key or network access
+
+IMAGERY_PATH = "/REST/v1/Imagery/Map/"
+DEFAULT_MAP_SIZE = (350, 350)  # Bing's default when mapSize is omitted
+
+# Behaviour knobs for the stub, shared by all handler threads
+class StubSettings:
+    def __init__(self, latency_ms=0, latency_jitter_ms=0, error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self):
+        with self.lock:
+            return self.random.random(), self.random.uniform(-1, 1)
+
+# Aerial-looking synthetic image: smooth terrain plus fine texture, encoded once per size
+@lru_cache(maxsize=16)
+def synthetic_png(width, height):
+    rng = np.random.default_rng(width * 10007 + height)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    terrain = np.sin(x / 37.0) * np.cos(y / 53.0) + np.sin((x + y) / 91.0)
+    texture = rng.normal(0, 0.35, (height, width)).astype(np.float32)
+    gray = (terrain + texture - (terrain + texture).min())
+    gray = gray / gray.max() * 255
+    rgb = np.stack([gray * 0.8, gray * 0.9, gray * 0.7], axis=-1).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb, "RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def parse_map_size(value):
+    try:
+        width, height = (int(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+    if not (80 <= width <= 2000 and 80 <= height <= 1500):
+        return None
+    return width, height
+
+class StubImageryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    settings = StubSettings()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if not parsed.path.startswith(IMAGERY_PATH):
+            return self.send_body(404, b"Not found")
+
+        # Point requests are /<style>/<lat,lon>/<zoom>, area requests are /<style>?mapArea=...
+        parts = [unquote(p) for p in parsed.path[len(IMAGERY_PATH):].split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if "key" not in query:
+            return self.send_body(401, b"Access was denied. You may have entered your credentials incorrectly.")
+        if not (len(parts) == 3 or (len(parts) == 1 and "mapArea" in query)):
+            return self.send_body(400, b"Bad request: expected /<style>/<center>/<zoom> or /<style>?mapArea=...")
+
+        map_size = parse_map_size(query["mapSize"]) if "mapSize" in query else DEFAULT_MAP_SIZE
+        if map_size is None:
+            return self.send_body(400, b"Bad request: invalid mapSize")
+
+        chance, jitter = self.settings.roll()
+        delay_ms = self.settings.latency_ms + jitter * self.settings.latency_jitter_ms
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        if chance < self.settings.throttle_rate:
+            return self.send_body(429, b"Too many requests", {"Retry-After": str(self.settings.retry_after)})
+        if chance < self.settings.throttle_rate + self.settings.error_rate:
+            return self.send_body(500, b"Internal server error")
+
+        self.send_body(200, synthetic_png(*map_size), {"Content-Type": "image/png"})
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Start the stub on a background thread, returns (server, base_url) for the imagery client
+def start_stub_server(settings=None, host="127.0.0.1", port=0):
+    handler = type("ConfiguredStubImageryHandler", (StubImageryHandler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}{IMAGERY_PATH}"
+    return server, base_url
+
+def add_stub_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=100, help="Mean added latency per request in ms (default: 100)")
+    parser.add_argument("--latency-jitter-ms", type=float, default=30, help="Uniform +/- jitter on the latency in ms (default: 30)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500 (default: 0)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429 (default: 0)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and failure sampling")
+
+def settings_from_args(args):
+    return StubSettings(args.latency_ms, args.latency_jitter_ms, args.error_rate, args.throttle_rate, args.retry_after, args.seed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Bing Maps static imagery API")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(settings_from_args(args), args.host, args.port)
+    print(f"Stub imagery server listening, pass --base-url {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,196 @@
+import importlib
+import os
+from functools import partial
+import numpy as np
+from PIL import Image
+from imagery_output import ImageEncoder
+
+## dithering engine shared by all process_imagery_* algorithms
+## the algorithm modules only implement dither(); the resolution check, pre-dither resize,
+## white-to-transparent conversion, upscale and edge crop live here once.
+## output is either black on transparent RGBA, or a 2-entry palette image that PNG stores at
+## 1 bit per pixel with the transparent white in a tRNS chunk (about 3x smaller and 4x faster to encode)
+## algorithm modules are imported on first use, so picking one does not import the others
+
+# name -> module implementing dither(image, **options), MIN_RESOLUTION and FINAL_SIZE
+DITHER_ALGORITHMS = {
+    "floyd-steinberg": "process_imagery_floydSteinberg",
+    "halftone": "process_imagery_halftone",
+    "ordered": "process_imagery_ordered",
+    "ordered-noise": "process_imagery_orderedNoise",
+    "atkinson": "process_imagery_errorDiffusion",
+    "jarvis-judice-ninke": "process_imagery_errorDiffusion",
+    "stucki": "process_imagery_errorDiffusion",
+    "sierra": "process_imagery_errorDiffusion",
+}
+
+# Default dither() options for algorithms that share a module
+ALGORITHM_OPTIONS = {
+    "atkinson": {"kernel": "atkinson"},
+    "jarvis-judice-ninke": {"kernel": "jarvis-judice-ninke"},
+    "stucki": {"kernel": "stucki"},
+    "sierra": {"kernel": "sierra"},
+}
+
+DEFAULT_DITHER = "halftone"
+
+OUTPUT_MODES = ("rgba", "palette")
+DEFAULT_OUTPUT_MODE = "rgba"
+
+# Palette output: index 0 is opaque black, index 1 is white and fully transparent
+PALETTE = [0, 0, 0, 255, 255, 255]
+TRANSPARENT_INDEX = 1
+_PALETTE_LUT = [TRANSPARENT_INDEX if value > 200 else 0 for value in range(256)]
+
+def register_algorithm(name, module_name, **options):
+    DITHER_ALGORITHMS[name] = module_name
+    if options:
+        ALGORITHM_OPTIONS[name] = options
+
+def check_algorithm(name):
+    if name not in DITHER_ALGORITHMS:
+        raise ValueError(f"Unknown dithering algorithm '{name}', choose from: {', '.join(sorted(DITHER_ALGORITHMS))}")
+
+def load_algorithm(name):
+    check_algorithm(name)
+    return importlib.import_module(DITHER_ALGORITHMS[name])
+
+# Skip images below the algorithm's minimum resolution
+def check_resolution(image, min_resolution, output_path):
+    width, height = image.size
+    if width < min_resolution or height < min_resolution:
+        print(f"Image for application_id {os.path.basename(output_path).split('.')[0]} was not processed due to low resolution.")
+        return False
+    return True
+
+# Resize (pre-dither) to the aspect ratio if one is specified, then convert to grayscale
+def prepare_grayscale(image, aspect_ratio=None):
+    if aspect_ratio:
+        width, height = image.size
+        new_width = int(min(width, height) * aspect_ratio)
+        new_height = int(min(width, height))
+        image = image.resize((new_width, new_height), Image.BILINEAR)
+    return image.convert('L')
+
+# NEAREST upscale to the final size, cropping the outer 2% if an aspect ratio is used
+def upscale(image, final_size, aspect_ratio=None):
+    image = image.resize(final_size, Image.NEAREST)
+    if aspect_ratio:
+        width, height = image.size
+        crop_pixels = int(min(width, height) * (2 / 100))  # Crop 2% from each edge
+        image = image.crop((crop_pixels, crop_pixels, width - crop_pixels, height - crop_pixels))
+    return image
+
+# White (also shades of white) becomes transparent, everything else opaque black
+def rgba_transparency(dithered):
+    return rgba_image(np.asarray(dithered.convert('L')) > 200)
+
+# Same as rgba_transparency as a 2-entry palette image
+def palette_transparency(dithered):
+    return palette_image(dithered.convert('L').point(_PALETTE_LUT))
+
+# Turn the dithered image into black on transparent RGBA at the final size, cropping the outer 2% if an aspect ratio is used
+def finalize_image(dithered, final_size, aspect_ratio=None):
+    # Upscale the single channel first; NEAREST only picks pixels, so this matches upscaling the RGBA image
+    print(f"rescaling to {final_size} pixels")
+    return rgba_transparency(upscale(dithered.convert('L'), final_size, aspect_ratio))
+
+# Same result as finalize_image, as a palette image; readers that convert('RGBA') get identical pixels.
+# White is thresholded at the dither resolution so only the 1-byte palette indices are upscaled
+def finalize_palette(dithered, final_size, aspect_ratio=None):
+    print(f"rescaling to {final_size} pixels")
+    return upscale(palette_transparency(dithered), final_size, aspect_ratio)
+
+# Black on transparent RGBA from a boolean mask (True = white)
+def rgba_image(white):
+    data = np.zeros(white.shape + (4,), dtype=np.uint8)
+    data[white] = (255, 255, 255, 0)
+    data[~white, 3] = 255
+    return Image.fromarray(data, 'RGBA')
+
+# 2-entry palette image from an L image or uint8 array of palette indices
+def palette_image(indices):
+    indexed = indices if isinstance(indices, Image.Image) else Image.fromarray(indices)
+    indexed.putpalette(PALETTE)
+    indexed.info["transparency"] = TRANSPARENT_INDEX
+    return indexed
+
+FINALIZERS = {
+    "rgba": finalize_image,
+    "palette": finalize_palette,
+}
+
+# Run the full pipeline for the named algorithm
+def process_image(image, output_path, dither=DEFAULT_DITHER, aspect_ratio=None, final_size=None, output_mode=DEFAULT_OUTPUT_MODE, **options):
+    algorithm = load_algorithm(dither)
+    if not check_resolution(image, algorithm.MIN_RESOLUTION, output_path):
+        return None
+
+    image = prepare_grayscale(image, aspect_ratio)
+    image = algorithm.dither(image, **{**ALGORITHM_OPTIONS.get(dither, {}), **options})
+    return FINALIZERS[output_mode](image, final_size or algorithm.FINAL_SIZE, aspect_ratio)
+
+# Indices Pillow's NEAREST resize picks from a source axis of this length
+def _nearest_indices(source, target):
+    return ((np.arange(target) + 0.5) * (source / target)).astype(np.intp)
+
+# Dithered (N, H, W) stack as a boolean mask (True = white); algorithms with dither_batch take the whole stack at once
+def dither_mask_batch(algorithm, pixels, **options):
+    if hasattr(algorithm, "dither_batch"):
+        return algorithm.dither_batch(pixels, **options)
+    return np.stack([np.asarray(algorithm.dither(Image.fromarray(tile), **options).convert('L')) > 200 for tile in pixels])
+
+# Run the full pipeline over many images at once. Equal-sized grayscale tiles are stacked into an
+# (N, H, W) array, then dithered, masked, upscaled and cropped as whole-batch array operations.
+# Returns one output image per input (None where skipped for low resolution), saved with encoder if output_paths is given
+def process_batch(images, output_paths=None, dither=DEFAULT_DITHER, aspect_ratio=None, final_size=None, output_mode=DEFAULT_OUTPUT_MODE, encoder=None, **options):
+    algorithm = load_algorithm(dither)
+    options = {**ALGORITHM_OPTIONS.get(dither, {}), **options}
+    final_width, final_height = final_size or algorithm.FINAL_SIZE
+    paths = output_paths or [None] * len(images)
+    encoder = encoder or ImageEncoder()
+
+    # Group the grayscale tiles by shape, an aspect ratio or mixed source sizes can give several stacks
+    stacks = {}
+    for index, (image, path) in enumerate(zip(images, paths)):
+        if check_resolution(image, algorithm.MIN_RESOLUTION, path or str(index)):
+            gray = np.asarray(prepare_grayscale(image, aspect_ratio))
+            stacks.setdefault(gray.shape, []).append((index, gray))
+
+    results = [None] * len(images)
+    for (height, width), members in stacks.items():
+        white = dither_mask_batch(algorithm, np.stack([gray for _, gray in members]), **options)
+
+        # Palette indices (or the white mask) at dither resolution, so only 1 byte per pixel is upscaled
+        if output_mode == "palette":
+            white = white.view(np.uint8) * np.uint8(TRANSPARENT_INDEX)
+
+        # NEAREST upscale and the 2% edge crop are one gather per axis over the whole stack;
+        # columns first, so the row gather copies whole rows
+        rows = _nearest_indices(height, final_height)
+        columns = _nearest_indices(width, final_width)
+        if aspect_ratio:
+            crop_pixels = int(min(final_width, final_height) * (2 / 100))
+            rows = rows[crop_pixels:final_height - crop_pixels]
+            columns = columns[crop_pixels:final_width - crop_pixels]
+        upscaled = np.take(np.take(white, columns, axis=2), rows, axis=1)
+        print(f"rescaling {len(members)} images to {(final_width, final_height)} pixels")
+
+        for (index, _), tile in zip(members, upscaled):
+            results[index] = palette_image(tile) if output_mode == "palette" else rgba_image(tile)
+            if paths[index] is not None:
+                encoder.save(results[index], paths[index])
+    return results
+
+# process_image bound to one algorithm; a partial of a module-level function, so it can be sent to worker processes
+def get_process_function(dither=DEFAULT_DITHER, output_mode=DEFAULT_OUTPUT_MODE, **options):
+    check_algorithm(dither)  # fail early on unknown names, the module itself loads on first use
+    if output_mode not in FINALIZERS:
+        raise ValueError(f"Unknown output mode '{output_mode}', choose from: {', '.join(OUTPUT_MODES)}")
+    return partial(process_image, dither=dither, output_mode=output_mode, **options)
+
+# Command line options shared by every entry point
+def add_dither_arguments(parser):
+    parser.add_argument("--dither", choices=sorted(DITHER_ALGORITHMS), default=DEFAULT_DITHER, help=f"Dithering algorithm (default: {DEFAULT_DITHER})")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+                        help=f"Processed image format: black on transparent RGBA, or a 1-bit palette PNG with tRNS transparency (default: {DEFAULT_OUTPUT_MODE})")
@@ -1,243 +1,371 @@
 import argparse
-import pandas as pd
-import requests
 import os
 import io
 import config
 from PIL import Image
-from tenacity import retry, stop_after_attempt, wait_exponential
 from datetime import datetime
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from bing_imagery_client import BingImageryClient, RateLimiter, BING_IMAGERY_URL
+from imagery_cache import add_cache_arguments, create_response_cache
+from imagery_retry import add_retry_arguments, create_throttle
+from job_manifest import JobManifest, FETCHED, PROCESSED, LOW_RES, FAILED
+from imagery_pipeline import ProcessingStage, RawEncoder, crop_map_image, raw_output_path, reprocess_directory, RAW_FORMATS
+from imagery_input import iter_point_rows, iter_area_rows
+from imagery_metrics import add_metrics_arguments, create_metrics, NULL_METRICS
+from imagery_output import ImageEncoder, add_output_arguments, create_encoder, OutputWriter
 
-# uncomment based on preferred processing algorithm
-# from process_imagery_floydSteinberg import process_image
-from process_imagery_halftone import process_image
-# from process_imagery_ordered import process_image
+from dithering_engine import get_process_function, add_dither_arguments, DEFAULT_DITHER
+
+# Processing algorithm, selected with --dither in main()
+process_image = get_process_function(DEFAULT_DITHER)
 
 current_date = datetime.now().strftime("%Y%m%d")
 
+# Shared imagery client, job manifest, optional process pool for dithering and stage metrics, created in main()
+client = None
+manifest = None
+processing_stage = None
+metrics = NULL_METRICS
+
+# Format of the saved raw crops and the background writer saving them, set in main()
+raw_format = "png"
+raw_writer = None
+
+# Raw crop saves still in flight, by unique_id; an image is only finished once its raw crop is on disk
+raw_saves = {}
+
+# Encoder for the processed images and the background writer used when processing inline, created in main()
+output_encoder = ImageEncoder()
+output_writer = None
+
+# Function to normalise unique_id to a string and remove any trailing .0 if present
+def normalize_unique_id(unique_id):
+    return str(int(float(unique_id)))
+
+# Function to record a job status in the manifest, if one is in use
+def record_status(unique_id, status, error=None):
+    if manifest is not None:
+        manifest.mark(unique_id, status, error)
+
+# Function to skip rows that a previous run already completed, one set lookup per row
+def pending_rows(rows, counts):
+    for row in rows:
+        unique_id = normalize_unique_id(row.unique_id)
+        if manifest is not None:
+            if manifest.is_completed(unique_id):
+                counts['skipped'] += 1
+                continue
+            if unique_id in manifest.failed:
+                counts['requeued'] += 1
+        yield unique_id, row
+
+def print_resume_counts(counts):
+    if manifest is not None:
+        print(f"Skipped {counts['skipped']} completed rows, re-queued {counts['requeued']} previously failed rows")
+
+# Function to open the job manifest, kept next to the undated processed output directory so a run restarted
+# on a later day still finds it. Returns (manifest or None, date suffix for the output directories);
+# a resumed run keeps writing into the directories of the run it continues
+def open_manifest(args, current_date):
+    if args.no_manifest:
+        return None, current_date
+    processed_output_dir = args.processed_output_dir_area if args.mode == "area" else args.processed_output_dir_point
+    job_manifest = JobManifest(args.manifest or processed_output_dir + "_manifest.sqlite")
+    run_date = job_manifest.run_date(current_date)
+    if run_date != current_date:
+        print(f"Resuming the run from {run_date} recorded in {job_manifest.path} (delete it to start a new run)")
+    return job_manifest, run_date
+
 # Function to create directories if they don't exist
 def create_directories(*dirs):
     for dir_path in dirs:
         os.makedirs(dir_path, exist_ok=True)
 
-def process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id):
+# Run fetch jobs serially or on a bounded thread pool, reporting progress through tqdm
+# jobs yields (unique_id, fetch_function arguments) pairs
+def run_fetch_jobs(fetch_function, jobs, concurrency=1, total=None):
+    if concurrency <= 1:
+        for unique_id, job in tqdm(jobs, total=total):
+            run_fetch_job(fetch_function, unique_id, job)
+        return
+
+    # Only keep a few jobs per worker in flight so large inputs are not all queued at once
+    max_in_flight = concurrency * 4
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, tqdm(total=total) as progress:
+        in_flight = set()
+        for unique_id, job in jobs:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                progress.update(len(done))
+            in_flight.add(executor.submit(run_fetch_job, fetch_function, unique_id, job))
+        done, _ = wait(in_flight)
+        progress.update(len(done))
+
+# The metrics record is started here so a fetch that raises is still counted as failed
+def run_fetch_job(fetch_function, unique_id, job):
+    record = metrics.start(unique_id)
+    try:
+        fetch_function(*job, record=record)
+    except Exception as e:
+        print(f"Failed to fetch map image for unique_id {unique_id}: {e}")
+        finish_image(unique_id, record, FAILED, repr(e))
+
+def process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id, record=None):
+    # Keep the raw crop so a different dither can be applied later without refetching,
+    # encoded on the raw writer thread while this image is processed and the next one fetched
+    if unprocessed_output_file_path is not None:
+        raw_saves[unique_id] = raw_writer.write(image, unprocessed_output_file_path, lambda seconds, error: metrics.add(record, {"raw_save": seconds}))
+
+    # Hand the image to the process pool when the fetch and process stages are decoupled
+    if processing_stage is not None:
+        processing_stage.submit(image, processed_output_file_path, unique_id, record)
+        return
+
     # Process the image
-    processed_image = process_image(image, processed_output_file_path)
+    with metrics.time(record, "process"):
+        processed_image = process_image(image, processed_output_file_path)
 
-    # If the image was processed successfully, save it
+    # If the image was processed successfully, encode it on the writer thread while the next fetch starts
     if processed_image is not None:
-        # Save the processed image
-        processed_image.save(processed_output_file_path)
+        output_writer.write(processed_image, processed_output_file_path, lambda seconds, error: image_saved(unique_id, record, seconds, error))
     else:
         print(f"Image for unique_id {unique_id} was not processed due to low resolution.")
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_bing_map_image_area(min_latitude, min_longitude, max_latitude, max_longitude, unique_id, map_style, map_size, angle, unprocessed_output_dir_area, processed_output_dir_area):
+        finish_image(unique_id, record, LOW_RES)
+
+# Called on the writer thread once a processed image is on disk
+def image_saved(unique_id, record, seconds, error):
+    metrics.add(record, {"save": seconds})
+    if error is not None:
+        print(f"Failed to save image for unique_id {unique_id}: {error}")
+        finish_image(unique_id, record, FAILED, repr(error))
+    else:
+        finish_image(unique_id, record, PROCESSED)
+
+# Called once the process pool has finished with an image
+def processing_done(unique_id, record, processed, timings, error):
+    metrics.add(record, timings)
+    if error is not None:
+        print(f"Failed to process image for unique_id {unique_id}: {error}")
+        finish_image(unique_id, record, FAILED, repr(error))
+    elif processed:
+        finish_image(unique_id, record, PROCESSED)
+    else:
+        print(f"Image for unique_id {unique_id} was not processed due to low resolution.")
+        finish_image(unique_id, record, LOW_RES)
+
+# Record the final status of an image in the manifest and the stage metrics, after its raw save if one is pending
+def finish_image(unique_id, record, status, error=None):
+    raw_save = raw_saves.pop(unique_id, None)
+    if raw_save is not None:
+        raw_save.add_done_callback(lambda future: raw_saved(unique_id, record, status, error, future.result()))
+        return
+    record_status(unique_id, status, error)
+    metrics.finish(record, status)
+
+# Called once the raw crop is on disk; a failed raw save fails the image
+def raw_saved(unique_id, record, status, error, raw_error):
+    if raw_error is not None:
+        print(f"Failed to save raw image for unique_id {unique_id}: {raw_error}")
+        status, error = FAILED, repr(raw_error)
+    finish_image(unique_id, record, status, error)
+
+def get_bing_map_image_area(min_latitude, min_longitude, max_latitude, max_longitude, unique_id, map_style, map_size, angle, unprocessed_output_dir_area, processed_output_dir_area, record):
     # Ensure angle is a float and constrain to [0, 360]
     angle = int(round(float(angle) % 360))  # Safeguard against invalid values and round to nearest integer
 
     # Ensure unique_id is a string and remove any trailing .0 if present
-    unique_id = str(int(float(unique_id)))
-
-    # Define the base URL for the Bing Maps Static API
-    base_url = "https://dev.virtualearth.net/REST/v1/Imagery/Map/"
-
-    # Define the parameters for the API request, including rotation using the 'dir' parameter
-    params = {
-        "mapArea": f"{min_latitude},{min_longitude},{max_latitude},{max_longitude}",
-        "mapSize": map_size,
-        "format": "png",
-        "dir": angle,  # Specify the camera rotation angle here
-        "key": config.bing_api_key,
-    }
+    unique_id = normalize_unique_id(unique_id)
 
-
-    # Create the full URL for the API request
-    full_url = base_url + map_style + "?" + "&".join(f"{key}={value}" for key, value in params.items())
-
-    # Make the API request
-    response = requests.get(full_url)
+    # Build and make the API request, including rotation using the 'dir' parameter
+    url, params = client.area_request(map_style, min_latitude, min_longitude, max_latitude, max_longitude, map_size, angle)
+    with metrics.time(record, "request"):
+        response = client.get(url, params)
 
     # Check that the request was successful
     if response.status_code == 200:
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(response.content))
-
-        # Define the dimensions for the crop
-        crop_percentage = 20  # percentage to crop from the bottom
-        crop_pixel = int((crop_percentage / 100) * image.height)  # calculate the number of pixels to crop
+        record_status(unique_id, FETCHED)
 
-        left = 0
-        top = 0
-        right = image.width
-        bottom = image.height - crop_pixel  # subtract the crop pixels from the height
+        # Open and decode the image using PIL
+        with metrics.time(record, "decode"):
+            image = Image.open(io.BytesIO(response.content))
+            image.load()
 
-        # Adjust left and right to maintain square aspect ratio
-        square_size = min(right, bottom)  # size of the square is the smaller of width and height
-        left = (image.width - square_size) / 2
-        right = left + square_size
-
-        # Crop the image
-        image = image.crop((left, top, right, bottom))
+        # Crop the attribution strip off the bottom, keeping a square
+        with metrics.time(record, "crop"):
+            image = crop_map_image(image)
 
         # Define the output file paths
-        unprocessed_output_file_path = os.path.join(unprocessed_output_dir_area, f"{unique_id}.png")
-        processed_output_file_path = os.path.join(processed_output_dir_area, f"{unique_id}.png")
+        unprocessed_output_file_path = raw_output_path(unprocessed_output_dir_area, unique_id, raw_format) if unprocessed_output_dir_area else None
+        processed_output_file_path = os.path.join(processed_output_dir_area, f"{unique_id}{output_encoder.extension}")
 
         # Process and save the image
-        process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id)
+        process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id, record)
     else:
         print(f"Failed to get map image: {response.content}")
+        finish_image(unique_id, record, FAILED, f"HTTP {response.status_code}: {response.content[:200]!r}")
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_bing_map_image_point(center_latitude, center_longitude, unique_id, map_style, map_size, zoom_level, angle, unprocessed_output_dir_point, processed_output_dir_point):
+def get_bing_map_image_point(center_latitude, center_longitude, unique_id, map_style, map_size, zoom_level, angle, unprocessed_output_dir_point, processed_output_dir_point, record):
     # Ensure angle is a valid integer between 0 and 360
     angle = int(round(float(angle) % 360))  # Safeguard against invalid values and round to nearest integer
 
     # Ensure unique_id is a string and remove any trailing .0 if present
-    unique_id = str(int(float(unique_id)))
-
-
-    # Define the base URL for the Bing Maps Static API
-    base_url = "https://dev.virtualearth.net/REST/v1/Imagery/Map/"
+    unique_id = normalize_unique_id(unique_id)
 
-    # Define the parameters for the API request, including rotation using the 'dir' parameter
-    params = {
-        "center": f"{center_latitude},{center_longitude}",
-        "zoomlevel": zoom_level,
-        "mapSize": map_size,
-        "format": "png",
-        "dir": angle,  # Specify the camera rotation angle here
-        "key": config.bing_api_key,
-    }
 
-    # Create the full URL for the API request
-    full_url = base_url + map_style + "/" + params["center"] + "/" + str(params["zoomlevel"]) + "?mapSize=" + params["mapSize"] + "&format=" + params["format"] + "&dir=" + str(params["dir"]) + "&key=" + params["key"]
-
-    # Make the API request
-    response = requests.get(full_url)
+    # Build and make the API request, including rotation using the 'dir' parameter
+    url, params = client.point_request(map_style, center_latitude, center_longitude, zoom_level, map_size, angle)
+    with metrics.time(record, "request"):
+        response = client.get(url, params)
 
     # Check that the request was successful
     if response.status_code == 200:
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(response.content))
-
-        # Define the dimensions for the crop
-        crop_percentage = 20  # percentage to crop from the bottom
-        crop_pixel = int((crop_percentage / 100) * image.height)  # calculate the number of pixels to crop
-
-        left = 0
-        top = 0
-        right = image.width
-        bottom = image.height - crop_pixel  # subtract the crop pixels from the height
+        record_status(unique_id, FETCHED)
 
-        # Adjust left and right to maintain square aspect ratio
-        square_size = min(right, bottom)  # size of the square is the smaller of width and height
-        left = (image.width - square_size) / 2
-        right = left + square_size
+        # Open and decode the image using PIL
+        with metrics.time(record, "decode"):
+            image = Image.open(io.BytesIO(response.content))
+            image.load()
 
-        # Crop the image
-        image = image.crop((left, top, right, bottom))
+        # Crop the attribution strip off the bottom, keeping a square
+        with metrics.time(record, "crop"):
+            image = crop_map_image(image)
 
         # Define the output file paths
-        unprocessed_output_file_path = os.path.join(unprocessed_output_dir_point, f"{unique_id}.png")
-        processed_output_file_path = os.path.join(processed_output_dir_point, f"{unique_id}.png")
+        unprocessed_output_file_path = raw_output_path(unprocessed_output_dir_point, unique_id, raw_format) if unprocessed_output_dir_point else None
+        processed_output_file_path = os.path.join(processed_output_dir_point, f"{unique_id}{output_encoder.extension}")
 
         # Process and save the image
-        process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id)
+        process_and_save_image(image, unprocessed_output_file_path, processed_output_file_path, unique_id, record)
     else:
         print(f"Failed to get map image: {response.content}")
-
-
-def process_point_mode(df, args, unprocessed_output_dir_point, processed_output_dir_point):
-    for index, row in tqdm(df.iterrows(), total=df.shape[0]):
-        # Download the image for the specific point (central coordinates)
-        center_latitude = row['center_latitude']
-        center_longitude = row['center_longitude']
-        unique_id = row['unique_id']
-        
-        # Get the angle, default to 0 if not found
-        angle = row['angle'] if pd.notnull(row['angle']) else 0
-
-        # Call Bing Maps API to get the image for a point
-        get_bing_map_image_point(
-            center_latitude, 
-            center_longitude, 
-            unique_id, 
-            args.map_style, 
-            args.map_size, 
-            args.zoom_level, 
-            angle,  # Pass the angle to rotate the camera view
-            unprocessed_output_dir_point, 
-            processed_output_dir_point
-        )
-
-
-def process_area_mode(df, args, unprocessed_output_dir_area, processed_output_dir_area):
-    for index, row in tqdm(df.iterrows(), total=df.shape[0]):
-        min_latitude = 90
-        max_latitude = -90
-        min_longitude = 180
-        max_longitude = -180
-
-        # Loop over each column to extract coordinates
-        for i in range(360):
-            if ',' in row[str(i)]:
-                try:
-                    latitude, longitude = map(float, row[str(i)].split(','))
-                    min_latitude = min(min_latitude, latitude)
-                    max_latitude = max(max_latitude, latitude)
-                    min_longitude = min(min_longitude, longitude)
-                    max_longitude = max(max_longitude, longitude)
-                except ValueError:
-                    pass
-
-        # Get the angle, default to 0 if not found
-        angle = row['angle'] if pd.notnull(row['angle']) else 0
-
-        # Download the image for the bounding box (area)
-        get_bing_map_image_area(
-            min_latitude, 
-            min_longitude, 
-            max_latitude, 
-            max_longitude, 
-            row['unique_id'], 
-            args.map_style, 
-            args.map_size, 
-            angle,  # Pass the angle for the area-based map
-            unprocessed_output_dir_area, 
-            processed_output_dir_area
-        )
+        finish_image(unique_id, record, FAILED, f"HTTP {response.status_code}: {response.content[:200]!r}")
+
+
+def process_point_mode(args, unprocessed_output_dir_point, processed_output_dir_point):
+    counts = {'skipped': 0, 'requeued': 0}
+
+    def jobs():
+        for unique_id, row in pending_rows(iter_point_rows(args.input_file), counts):
+            # Arguments for the Bing Maps API call for the specific point (central coordinates)
+            yield unique_id, (
+                row.center_latitude,
+                row.center_longitude,
+                unique_id,
+                args.map_style,
+                args.map_size,
+                args.zoom_level,
+                row.angle,  # Pass the angle to rotate the camera view
+                unprocessed_output_dir_point,
+                processed_output_dir_point
+            )
+
+    run_fetch_jobs(get_bing_map_image_point, jobs(), args.concurrency)
+    print_resume_counts(counts)
+
+
+def process_area_mode(args, unprocessed_output_dir_area, processed_output_dir_area):
+    counts = {'skipped': 0, 'requeued': 0}
+
+    def jobs():
+        # Bounding boxes come precomputed per chunk from the 360 "lat,lon" vertex columns
+        for unique_id, row in pending_rows(iter_area_rows(args.input_file), counts):
+            # Arguments for the Bing Maps API call for the bounding box (area)
+            yield unique_id, (
+                row.min_latitude,
+                row.min_longitude,
+                row.max_latitude,
+                row.max_longitude,
+                unique_id,
+                args.map_style,
+                args.map_size,
+                row.angle,  # Pass the angle for the area-based map
+                unprocessed_output_dir_area,
+                processed_output_dir_area
+            )
+
+    run_fetch_jobs(get_bing_map_image_area, jobs(), args.concurrency)
+    print_resume_counts(counts)
+
+def reprocess_mode(args):
+    current_date = datetime.now().strftime("%Y%m%d")
+    processed_output_dir = (args.processed_output_dir_area if args.mode == "area" else args.processed_output_dir_point) + "_" + current_date
+    print(f"Reprocessing raw images in {args.reprocess} into {processed_output_dir}")
+    reprocess_directory(process_image, args.reprocess, processed_output_dir, workers=args.process_workers or None, encoder=output_encoder)
 
 def main(args):
+    global client, manifest, processing_stage, raw_format, raw_writer, metrics, process_image, output_encoder, output_writer
     current_date = datetime.now().strftime("%Y%m%d")
-
-    # Modify directory names to append the current date
+    process_image = get_process_function(args.dither, args.output_mode)
+    raw_format = args.raw_format
+    output_encoder = create_encoder(args)
+    metrics = create_metrics(args)
+
+    # Re-run the dithering over saved raw crops only, no network access
+    if args.reprocess:
+        reprocess_mode(args)
+        return
+
+    rate_limiter = RateLimiter(args.max_rps) if args.max_rps else None
+    client = BingImageryClient(
+        config.bing_api_key,
+        base_url=args.base_url,
+        pool_size=max(1, args.concurrency),
+        rate_limiter=rate_limiter,
+        cache=create_response_cache(args),
+        cache_only=args.cache_only,
+        refresh=args.refresh,
+        throttle=create_throttle(args, rate_limiter)
+    )
+
+    # Resume from the job manifest unless told otherwise, in the dated directories of the run it records
+    manifest, current_date = open_manifest(args, current_date)
+
+    # Modify directory names to append the run's date
     if args.mode == "area":
         unprocessed_output_dir_area = args.unprocessed_output_dir_area + "_" + current_date
         processed_output_dir_area = args.processed_output_dir_area + "_" + current_date
         create_directories(unprocessed_output_dir_area, processed_output_dir_area)
+        if args.no_save_raw:
+            unprocessed_output_dir_area = None
     elif args.mode == "point":
         unprocessed_output_dir_point = args.unprocessed_output_dir_point + "_" + current_date
         processed_output_dir_point = args.processed_output_dir_point + "_" + current_date
         create_directories(unprocessed_output_dir_point, processed_output_dir_point)
+        if args.no_save_raw:
+            unprocessed_output_dir_point = None
 
-    # Load the data
-    df = pd.read_csv(args.input_file)
+    # Dither and encode on a process pool so the CPU work overlaps the downloads
+    if args.process_workers:
+        processing_stage = ProcessingStage(process_image, workers=args.process_workers, on_done=processing_done, encoder=output_encoder)
+    else:
+        output_writer = OutputWriter(output_encoder, threads=args.writer_threads)
+    raw_writer = OutputWriter(RawEncoder(raw_format), threads=args.writer_threads)
 
-    # Call the appropriate processing function based on the selected mode
+    # Call the appropriate processing function based on the selected mode, rows are streamed from the CSV
     if args.mode == "area":
-        process_area_mode(df, args, unprocessed_output_dir_area, processed_output_dir_area)
+        process_area_mode(args, unprocessed_output_dir_area, processed_output_dir_area)
     elif args.mode == "point":
-        process_point_mode(df, args, unprocessed_output_dir_point, processed_output_dir_point)
-
+        process_point_mode(args, unprocessed_output_dir_point, processed_output_dir_point)
+
+    if processing_stage is not None:
+        processing_stage.close()
+    if output_writer is not None:
+        output_writer.close()
+    # Last, images whose processing finished first are recorded as their raw save completes
+    raw_writer.close()
+    print(client.summary())
+    client.close()
+    metrics.close()
+    if manifest is not None:
+        print(f"Manifest {manifest.path}: {manifest.summary()}")
+        manifest.close()
     print("Process completed.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download Bing Maps images for specific points or areas from a CSV file")
-    parser.add_argument("input_file", help="Path to the input CSV file")
+    parser.add_argument("input_file", nargs="?", help="Path to the input CSV file (not needed with --reprocess)")
     parser.add_argument("--mode", choices=["area", "point"], required=True, help="Choose the mode: area (based on extents) or point (based on central coordinates)")
     parser.add_argument("--unprocessed-output-dir-area", default="output/unprocessed/area", help="Output directory for unprocessed area images")
     parser.add_argument("--processed-output-dir-area", default="output/processed/area", help="Output directory for processed area images")
@@ -246,5 +374,21 @@ if __name__ == "__main__":
     parser.add_argument("--map-style", default="Aerial", help="Bing Maps style (e.g., Aerial)")
     parser.add_argument("--map-size", default="500,500", help="Map size in pixels (e.g., 500,500)")
     parser.add_argument("--zoom-level", type=int, default=15, help="Bing Maps zoom level (only for point mode)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of images to fetch in parallel (default: 1, serial)")
+    parser.add_argument("--max-rps", type=float, default=None, help="Maximum API requests per second across all workers")
+    parser.add_argument("--process-workers", type=int, default=0, help="Number of processes that dither and save images while fetching continues (default: 0, process inline)")
+    add_dither_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--raw-format", choices=sorted(RAW_FORMATS), default="png", help="Lossless format for the saved raw crops (default: png)")
+    parser.add_argument("--no-save-raw", action="store_true", help="Do not save the raw cropped images")
+    parser.add_argument("--reprocess", metavar="RAW_DIR", default=None, help="Re-run the dithering over the raw crops in RAW_DIR on all cores instead of fetching")
+    parser.add_argument("--base-url", default=BING_IMAGERY_URL, help="Imagery endpoint, e.g. a local bing_stub_server.py for testing")
+    add_cache_arguments(parser)
+    add_retry_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument("--manifest", default=None, help="Path of the job manifest used to resume interrupted runs (default: next to the undated processed output directory)")
+    parser.add_argument("--no-manifest", action="store_true", help="Do not record or skip completed jobs")
     args = parser.parse_args()
+    if args.input_file is None and args.reprocess is None:
+        parser.error("input_file is required unless --reprocess is given")
     main(args)
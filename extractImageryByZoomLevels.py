@@ -1,70 +1,88 @@
 import argparse
 import pandas as pd
-import requests
 import os
 import io
 import config
 from PIL import Image
-from process_imagery_halftone import process_image
-from tenacity import retry, stop_after_attempt, wait_exponential
+from dithering_engine import get_process_function, add_dither_arguments, DEFAULT_DITHER
 from tqdm import tqdm
+from bing_imagery_client import BingImageryClient, BING_IMAGERY_URL
+from imagery_cache import add_cache_arguments, create_response_cache
+from imagery_retry import add_retry_arguments, create_throttle
+from imagery_pipeline import crop_map_image
+from imagery_metrics import add_metrics_arguments, create_metrics, NULL_METRICS
+from imagery_output import add_output_arguments, create_output_writer
 
 ## original use case: 
 ## docents tour 2024 poster gifs
 
+# Shared imagery client, stage metrics and background writer for the processed images, created in main()
+client = None
+metrics = NULL_METRICS
+output_writer = None
+
+# Processing algorithm, selected with --dither in main()
+process_image = get_process_function(DEFAULT_DITHER)
+
 def create_directories(*dirs):
     for dir_path in dirs:
         os.makedirs(dir_path, exist_ok=True)
 
-def process_and_save_image(image, output_file_path, city, zoom_level):
-    processed_image = process_image(image, output_file_path)
+def process_and_save_image(image, output_file_path, city, zoom_level, record=None):
+    with metrics.time(record, "process"):
+        processed_image = process_image(image, output_file_path)
     if processed_image is not None:
-        processed_image.save(output_file_path)
+        output_writer.write(processed_image, output_file_path, lambda seconds, error: image_saved(city, zoom_level, record, seconds, error))
     else:
         print(f"Image for {city} at zoom level {zoom_level} was not processed due to low resolution.")
+        metrics.finish(record, "low_res")
+
+# Called on the writer thread once a processed image is on disk
+def image_saved(city, zoom_level, record, seconds, error):
+    metrics.add(record, {"save": seconds})
+    if error is not None:
+        print(f"Failed to save image for {city} at zoom level {zoom_level}: {error}")
+        metrics.finish(record, "failed")
+    else:
+        metrics.finish(record, "processed")
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def get_bing_map_image(center_latitude, center_longitude, city, zoom_level, map_style, map_size):
-    base_url = "https://dev.virtualearth.net/REST/v1/Imagery/Map/"
-    params = {
-        "center": f"{center_latitude},{center_longitude}",
-        "zoomlevel": zoom_level,
-        "mapSize": map_size,
-        "format": "png",
-        "key": config.bing_api_key,
-    }
-    full_url = base_url + map_style + "/" + params["center"] + "/" + str(params["zoomlevel"]) + "?mapSize=" + params["mapSize"] + "&format=" + params["format"] + "&key=" + params["key"]
-    response = requests.get(full_url)
+    url, params = client.point_request(map_style, center_latitude, center_longitude, zoom_level, map_size)
+    record = metrics.start(f"{city}_{zoom_level}")
+    with metrics.time(record, "request"):
+        response = client.get(url, params)
 
     if response.status_code == 200:
-        image = Image.open(io.BytesIO(response.content))
-        crop_percentage = 20
-        crop_pixel = int((crop_percentage/100) * image.height)
-        left = 0
-        top = 0
-        right = image.width
-        bottom = image.height - crop_pixel
-        square_size = min(right, bottom)
-        left = (image.width - square_size) / 2
-        right = left + square_size
-        image = image.crop((left, top, right, bottom))
-        output_file_path = os.path.join(args.output_dir, f"{city}_{zoom_level}.png")
-        process_and_save_image(image, output_file_path, city, zoom_level)
+        with metrics.time(record, "decode"):
+            image = Image.open(io.BytesIO(response.content))
+            image.load()
+        with metrics.time(record, "crop"):
+            image = crop_map_image(image)
+        output_file_path = os.path.join(args.output_dir, f"{city}_{zoom_level}{output_writer.encoder.extension}")
+        process_and_save_image(image, output_file_path, city, zoom_level, record)
     else:
         print(f"Failed to get map image for {city} at zoom level {zoom_level}: {response.content}")
+        metrics.finish(record, "failed")
 
 def main(args):
+    global client, metrics, process_image, output_writer
+    process_image = get_process_function(args.dither, args.output_mode)
+    metrics = create_metrics(args)
+    output_writer = create_output_writer(args)
+    client = BingImageryClient(config.bing_api_key, base_url=args.base_url, cache=create_response_cache(args), cache_only=args.cache_only, refresh=args.refresh, throttle=create_throttle(args))
     create_directories(args.output_dir)
-    df = pd.read_csv(args.input_file)
+    # Only the coordinate columns are needed
+    df = pd.read_csv(args.input_file, usecols=['city', 'lon', 'lat'])
     unique_coords = df[['city', 'lon', 'lat']].drop_duplicates()
     print(unique_coords)
 
-    for index, row in tqdm(unique_coords.iterrows(), total=unique_coords.shape[0]):
-        lat = row['lat']
-        lon = row['lon']
-        city = row['city']
+    for city, lon, lat in tqdm(unique_coords.itertuples(index=False), total=unique_coords.shape[0]):
         for zoom_level in range(5, 20):
             get_bing_map_image(lat, lon, city, zoom_level, args.map_style, args.map_size)
+    output_writer.close()
+    print(client.summary())
+    client.close()
+    metrics.close()
     print("done.")
 
 if __name__ == "__main__":
@@ -73,5 +91,11 @@ if __name__ == "__main__":
     parser.add_argument("--output-dir", default="output/tour_2024_2", help="Output directory for images")
     parser.add_argument("--map-style", default="Aerial", help="Bing Maps style (e.g., Aerial)")
     parser.add_argument("--map-size", default="1280,1280", help="Map size in pixels (e.g., 500,500)")
+    add_dither_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--base-url", default=BING_IMAGERY_URL, help="Imagery endpoint, e.g. a local bing_stub_server.py for testing")
+    add_cache_arguments(parser)
+    add_retry_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+## content-addressed on-disk cache of raw Bing imagery responses
+## entries are keyed by the request (style, center/mapArea, zoom, mapSize, dir ...)
+## with the API key left out, plus the host when it is not the real Bing endpoint,
+## and evicted least-recently-used past a size cap
+
+DEFAULT_CACHE_DIR = "output/cache/bing"
+
+# Hash the parts of a request that determine the returned image
+# host is left out for the real Bing endpoint so existing entries stay valid, and set for any
+# other server (e.g. bing_stub_server.py) so its responses never answer a real request
+def request_key(path, params, host=None):
+    key_params = {k: str(v) for k, v in params.items() if k != "key"}
+    request = {"path": path, "params": key_params}
+    if host is not None:
+        request["host"] = host
+    payload = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Rebuild the LRU order from file access times, oldest first
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_atime, name, stat.st_size))
+        entries.sort()
+        self.entries = OrderedDict((name, size) for _, name, size in entries)
+        self.total_bytes = sum(self.entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            # Removed behind our back, treat as a miss
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        os.utime(path)
+        return content
+
+    def put(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so a crash never leaves a truncated entry behind
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(content)
+            self.total_bytes += len(content)
+            self._evict()
+
+    # Drop least-recently-used entries until the cache fits under max_bytes
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def summary(self):
+        return f"cache: {self.hits} hits, {self.misses} misses, {self.total_bytes / 1e6:.1f} MB in {len(self.entries)} entries"
+
+# Command line options shared by the fetch scripts
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for cached raw API responses")
+    parser.add_argument("--cache-size-mb", type=float, default=2048, help="Maximum size of the response cache in MB, least recently used entries are evicted (default: 2048)")
+    # --cache-only without a cache would have nothing to read, --refresh nothing to update
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    cache_mode.add_argument("--cache-only", action="store_true", help="Only use cached responses, never call the API")
+    cache_mode.add_argument("--refresh", action="store_true", help="Ignore cached responses and re-download (the cache is updated)")
+
+def create_response_cache(args):
+    if args.no_cache:
+        return None
+    return ResponseCache(args.cache_dir, max_bytes=int(args.cache_size_mb * 1e6))
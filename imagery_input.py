@@ -0,0 +1,87 @@
+import warnings
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+## input parsing for the fetch scripts
+
+# FCC contour files store one "lat,lon" vertex per column, named '0' ... '359'
+CONTOUR_COLUMNS = [str(i) for i in range(360)]
+
+# Parse the "lat,lon" vertex columns into an (N, 360, 2) float array, NaN where a vertex is missing or malformed
+def parse_contour_vertices(df):
+    columns = [c for c in CONTOUR_COLUMNS if c in df.columns]
+    cells = df[columns].to_numpy().ravel()
+    if len(cells) == 0:
+        return np.full((len(df), len(columns), 2), np.nan)
+
+    # Same rule as the old per-cell loop: a string with exactly one comma and two parseable numbers.
+    # Everything is joined into one string and parsed by NumPy's C float parser in a single call
+    text = ",".join(c if type(c) is str and c.count(",") == 1 else "nan,nan" for c in cells)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            values = np.fromstring(text, sep=",")
+    except (DeprecationWarning, ValueError):
+        values = None
+
+    if values is None or values.size != 2 * len(cells):
+        # Some cell has a comma but is not two numbers, fall back to parsing cell by cell
+        values = np.array([_parse_vertex(c) for c in cells], dtype=float)
+
+    vertices = values.reshape(len(cells), 2)
+    # A vertex only counts if both coordinates parsed
+    vertices[np.isnan(vertices).any(axis=1)] = np.nan
+    return vertices.reshape(len(df), len(columns), 2)
+
+def _parse_vertex(cell):
+    if type(cell) is not str or "," not in cell:
+        return np.nan, np.nan
+    try:
+        latitude, longitude = map(float, cell.split(","))
+    except ValueError:
+        return np.nan, np.nan
+    return latitude, longitude
+
+# Per-row extents as an (N, 4) array of min_latitude, min_longitude, max_latitude, max_longitude
+# Rows with no valid vertex keep the old loop's starting values (90, 180, -90, -180)
+def compute_area_bboxes(df):
+    vertices = parse_contour_vertices(df)
+    latitudes = vertices[:, :, 0]
+    longitudes = vertices[:, :, 1]
+    return np.stack([
+        np.fmin.reduce(latitudes, axis=1, initial=90.0),
+        np.fmin.reduce(longitudes, axis=1, initial=180.0),
+        np.fmax.reduce(latitudes, axis=1, initial=-90.0),
+        np.fmax.reduce(longitudes, axis=1, initial=-180.0),
+    ], axis=1)
+
+# Lightweight row records yielded by the streaming readers
+PointRow = namedtuple("PointRow", ["unique_id", "center_latitude", "center_longitude", "angle"])
+AreaRow = namedtuple("AreaRow", ["unique_id", "angle", "min_latitude", "min_longitude", "max_latitude", "max_longitude"])
+
+DEFAULT_CHUNK_SIZE = 5000
+
+def _read_chunks(input_file, columns, chunksize):
+    wanted = set(columns)
+    return pd.read_csv(input_file, usecols=lambda c: c in wanted, chunksize=chunksize, dtype={c: object for c in columns if c in CONTOUR_COLUMNS})
+
+def _angles(chunk):
+    # Missing angle column or value defaults to 0
+    if "angle" not in chunk.columns:
+        return [0] * len(chunk)
+    return chunk["angle"].fillna(0).tolist()
+
+# Stream point-mode rows in chunks so memory stays constant regardless of file size
+def iter_point_rows(input_file, chunksize=DEFAULT_CHUNK_SIZE):
+    for chunk in _read_chunks(input_file, ["unique_id", "center_latitude", "center_longitude", "angle"], chunksize):
+        rows = zip(chunk["unique_id"].tolist(), chunk["center_latitude"].tolist(), chunk["center_longitude"].tolist(), _angles(chunk))
+        for row in rows:
+            yield PointRow(*row)
+
+# Stream area-mode rows, computing each chunk's bounding boxes in one vectorized pass
+def iter_area_rows(input_file, chunksize=DEFAULT_CHUNK_SIZE):
+    for chunk in _read_chunks(input_file, ["unique_id", "angle"] + CONTOUR_COLUMNS, chunksize):
+        bboxes = compute_area_bboxes(chunk).tolist()
+        for unique_id, angle, bbox in zip(chunk["unique_id"].tolist(), _angles(chunk), bboxes):
+            yield AreaRow(unique_id, angle, *bbox)
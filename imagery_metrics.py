@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+## per-stage timing for the imagery pipeline (request, decode, crop, process, save)
+## writes one JSONL record per image, an end-of-run summary with histograms and
+## optionally a Prometheus text-format file for the node exporter textfile collector
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+class _StageTimer:
+    __slots__ = ("record", "stage", "start")
+
+    def __init__(self, record, stage):
+        self.record = record
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.record["stages"][self.stage] = self.record["stages"].get(self.stage, 0.0) + time.perf_counter() - self.start
+        return False
+
+class PipelineMetrics:
+    enabled = True
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.lock = threading.Lock()
+        self.durations = {}  # stage -> list of seconds
+        self.status_counts = {}
+        self.started = time.time()
+        self.jsonl_file = None
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            self.jsonl_file = open(jsonl_path, "a")
+
+    def start(self, image_id):
+        return {"id": image_id, "stages": {}}
+
+    def time(self, record, stage):
+        return _StageTimer(record, stage)
+
+    # Merge stage durations measured elsewhere, e.g. in a worker process
+    def add(self, record, timings):
+        for stage, seconds in timings.items():
+            record["stages"][stage] = record["stages"].get(stage, 0.0) + seconds
+
+    def finish(self, record, status):
+        record["status"] = status
+        record["total"] = sum(record["stages"].values())
+        with self.lock:
+            for stage, seconds in record["stages"].items():
+                self.durations.setdefault(stage, []).append(seconds)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if self.jsonl_file is not None:
+                self.jsonl_file.write(json.dumps({**record, "time": time.time()}) + "\n")
+
+    def summary(self):
+        lines = [f"Stage timings over {sum(self.status_counts.values())} images ({self._status_text()}):"]
+        for stage, values in self.durations.items():
+            ordered = sorted(values)
+            total = sum(ordered)
+            lines.append(
+                f"  {stage:<10} n={len(ordered):<7} total={total:8.1f}s mean={total / len(ordered) * 1000:8.1f}ms "
+                f"p50={_percentile(ordered, 0.5) * 1000:8.1f}ms p99={_percentile(ordered, 0.99) * 1000:8.1f}ms"
+            )
+            counts = _bucket_counts(ordered)
+            peak = max(counts) or 1
+            previous = 0.0
+            for bound, count in zip(BUCKETS, counts):
+                label = f"{previous * 1000:g}-{bound * 1000:g}ms" if bound != float("inf") else f">{previous * 1000:g}ms"
+                if count:
+                    lines.append(f"    {label:>14} {'#' * max(1, round(count / peak * 40))} {count}")
+                previous = bound
+        return "\n".join(lines)
+
+    def _status_text(self):
+        return ", ".join(f"{status}: {count}" for status, count in sorted(self.status_counts.items()))
+
+    def write_prometheus(self):
+        lines = [
+            "# HELP imagery_stage_seconds Time spent per image in each pipeline stage.",
+            "# TYPE imagery_stage_seconds histogram",
+        ]
+        for stage, values in self.durations.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS, _bucket_counts(values)):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'imagery_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'imagery_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+            lines.append(f'imagery_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+        lines.append("# HELP imagery_images_total Images handled by the pipeline, by final status.")
+        lines.append("# TYPE imagery_images_total counter")
+        for status, count in sorted(self.status_counts.items()):
+            lines.append(f'imagery_images_total{{status="{status}"}} {count}')
+        lines.append("# HELP imagery_run_start_time_seconds Unix time the run started.")
+        lines.append("# TYPE imagery_run_start_time_seconds gauge")
+        lines.append(f"imagery_run_start_time_seconds {self.started:.0f}")
+
+        # Write atomically so the node exporter never reads a half-written file
+        temp_path = self.prometheus_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.prometheus_path)
+
+    def close(self):
+        with self.lock:
+            if self.jsonl_file is not None:
+                self.jsonl_file.close()
+                self.jsonl_file = None
+            if self.prometheus_path:
+                self.write_prometheus()
+        print(self.summary())
+
+# Stand-in used when metrics are off, every call is a no-op
+class DisabledMetrics:
+    enabled = False
+    _context = nullcontext()
+
+    def start(self, image_id):
+        return None
+
+    def time(self, record, stage):
+        return self._context
+
+    def add(self, record, timings):
+        pass
+
+    def finish(self, record, status):
+        pass
+
+    def close(self):
+        pass
+
+NULL_METRICS = DisabledMetrics()
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _bucket_counts(values):
+    counts = [0] * len(BUCKETS)
+    for value in values:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                counts[i] += 1
+                break
+    return counts
+
+# Command line options shared by the fetch scripts
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", action="store_true", help="Time each pipeline stage and print a summary at the end of the run")
+    parser.add_argument("--metrics-jsonl", default=None, help="Write one timing record per image to this JSONL file (implies --metrics)")
+    parser.add_argument("--metrics-prom", default=None, help="Write Prometheus text-format metrics to this file at the end of the run (implies --metrics)")
+
+def create_metrics(args):
+    if not (args.metrics or args.metrics_jsonl or args.metrics_prom):
+        return NULL_METRICS
+    return PipelineMetrics(args.metrics_jsonl, args.metrics_prom)
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+## output writer for the processed images: each image is encoded exactly once, here.
+## the dithering engine only returns images; ImageEncoder holds the format settings and is
+## small enough to send to worker processes, OutputWriter runs the encode on background
+## threads so it overlaps the next fetch (Pillow releases the GIL while compressing)
+
+# Lossless formats for the processed images
+OUTPUT_FORMATS = {
+    "png": ".png",
+    "webp": ".webp",
+    "tiff": ".tif",  # 1-bit Group 4, transparency is dropped and reads back as white
+}
+DEFAULT_OUTPUT_FORMAT = "png"
+
+# 1-bit image with white wherever the processed image is white or transparent
+def to_bilevel(image):
+    if image.mode == "1":
+        return image
+    if "A" in image.getbands():
+        image = image.getchannel("A").point(lambda alpha: 0 if alpha else 255)
+    return image.convert("1", dither=Image.Dither.NONE)
+
+class ImageEncoder:
+    def __init__(self, output_format=DEFAULT_OUTPUT_FORMAT, compress_level=6, optimize=False):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', choose from: {', '.join(OUTPUT_FORMATS)}")
+        self.output_format = output_format
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.extension = OUTPUT_FORMATS[output_format]
+
+    # The path with this format's extension
+    def output_path(self, path):
+        return os.path.splitext(path)[0] + self.extension
+
+    # Encode through a temp file so readers never see a half-written image
+    def save(self, image, path):
+        temp_path = path + ".tmp"
+        if self.output_format == "png":
+            image.save(temp_path, format="PNG", compress_level=self.compress_level, optimize=self.optimize)
+        elif self.output_format == "webp":
+            # WebP lossless effort: compress level 0-9 maps onto method 0-6, optimize is the slowest setting
+            method = 6 if self.optimize else self.compress_level * 6 // 9
+            image.save(temp_path, format="WEBP", lossless=True, exact=True, quality=100 if self.optimize else 80, method=method)
+        else:
+            to_bilevel(image).save(temp_path, format="TIFF", compression="group4")
+        os.replace(temp_path, path)
+
+class OutputWriter:
+    def __init__(self, encoder, threads=1, max_pending=None):
+        self.encoder = encoder
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="output-writer")
+
+        # Once this many images are waiting to be encoded, write() blocks so memory stays bounded
+        self.slots = threading.BoundedSemaphore(max_pending or threads * 4)
+
+    # Queue one image; on_done(seconds, error) is called on the writer thread once it is on disk.
+    # The returned future's result is the error, or None
+    def write(self, image, path, on_done=None):
+        self.slots.acquire()
+        try:
+            return self.executor.submit(self._write, image, path, on_done)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _write(self, image, path, on_done):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.encoder.save(image, path)
+        except Exception as e:
+            error = e
+        finally:
+            self.slots.release()
+        if on_done is not None:
+            on_done(time.perf_counter() - start, error)
+        return error
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+# Command line options shared by every script that writes processed images
+def add_output_arguments(parser):
+    parser.add_argument("--output-format", choices=sorted(OUTPUT_FORMATS), default=DEFAULT_OUTPUT_FORMAT,
+                        help=f"Processed image format: png, webp (lossless) or tiff (1-bit Group 4) (default: {DEFAULT_OUTPUT_FORMAT})")
+    parser.add_argument("--compress-level", type=int, choices=range(10), default=6, metavar="0-9", help="Compression effort, zlib level for PNG (default: 6)")
+    parser.add_argument("--optimize", action="store_true", help="Slowest, smallest encode (PNG optimize, WebP method 6)")
+    parser.add_argument("--writer-threads", type=int, default=1, help="Background threads encoding processed images (default: 1)")
+
+def create_encoder(args):
+    return ImageEncoder(args.output_format, args.compress_level, args.optimize)
+
+def create_output_writer(args):
+    return OutputWriter(create_encoder(args), threads=args.writer_threads)
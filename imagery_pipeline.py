@@ -0,0 +1,178 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from tqdm import tqdm
+from job_manifest import PROCESSED, LOW_RES, UNCHANGED, FAILED
+from imagery_output import ImageEncoder
+
+## fetch/process pipeline for the Bing imagery scripts
+## network threads download and crop, a process pool runs the dithering and the encode
+
+# Crop the Bing logo/attribution strip off the bottom and keep a centered square
+def crop_map_image(image, crop_percentage=20):
+    crop_pixel = int((crop_percentage / 100) * image.height)  # calculate the number of pixels to crop
+
+    top = 0
+    bottom = image.height - crop_pixel  # subtract the crop pixels from the height
+
+    # Adjust left and right to maintain square aspect ratio
+    square_size = min(image.width, bottom)  # size of the square is the smaller of width and height
+    left = (image.width - square_size) / 2
+    right = left + square_size
+
+    return image.crop((left, top, right, bottom))
+
+# Lossless formats for the raw crops; WebP lossless is usually well under half the size of PNG.
+# The raw PNG is an intermediate, zlib level 1 is ~3x faster than 6 and no bigger on noisy aerial crops
+RAW_FORMATS = {
+    "png": (".png", {"format": "PNG", "compress_level": 1}),
+    "webp": (".webp", {"format": "WEBP", "lossless": True, "quality": 100, "method": 4}),
+}
+RAW_EXTENSIONS = tuple(extension for extension, _ in RAW_FORMATS.values())
+
+def raw_output_path(output_dir, unique_id, raw_format="png"):
+    return os.path.join(output_dir, f"{unique_id}{RAW_FORMATS[raw_format][0]}")
+
+# Save the cropped image before dithering so it can be reprocessed later without refetching
+def save_raw_image(image, output_path, raw_format="png"):
+    temp_path = output_path + ".tmp"
+    image.save(temp_path, **RAW_FORMATS[raw_format][1])
+    os.replace(temp_path, output_path)
+
+# Stand-in for ImageEncoder so raw crops can be written by an OutputWriter off the fetch threads
+class RawEncoder:
+    def __init__(self, raw_format="png"):
+        self.raw_format = raw_format
+        self.extension = RAW_FORMATS[raw_format][0]
+
+    def save(self, image, path):
+        save_raw_image(image, path, self.raw_format)
+
+# Runs in a worker process: dither and save one image, the only encode it gets
+# returns (processed, timings) where processed is False if it was skipped for low resolution
+def process_and_save(process_function, image, processed_output_file_path, encoder=None):
+    start = time.perf_counter()
+    processed_image = process_function(image, processed_output_file_path)
+    processed_at = time.perf_counter()
+    if processed_image is None:
+        return False, {"process": processed_at - start}
+    (encoder or ImageEncoder()).save(processed_image, processed_output_file_path)
+    return True, {"process": processed_at - start, "save": time.perf_counter() - processed_at}
+
+class ProcessingStage:
+    def __init__(self, process_function, workers=None, max_pending=None, on_done=None, encoder=None):
+        self.process_function = process_function
+        self.encoder = encoder
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        # Bounded hand-off between the fetch threads and the process pool: once this many
+        # images are waiting to be dithered, fetch threads block until a slot frees up
+        self.slots = threading.BoundedSemaphore(max_pending or self.workers * 2)
+
+        # on_done(unique_id, record, processed, timings, error) is called from the executor's callback thread
+        self.on_done = on_done
+
+    def submit(self, image, processed_output_file_path, unique_id, record=None):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(process_and_save, self.process_function, image, processed_output_file_path, self.encoder)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self._done(f, unique_id, record))
+
+    def _done(self, future, unique_id, record):
+        self.slots.release()
+        if self.on_done is None:
+            return
+        error = future.exception()
+        processed, timings = future.result() if error is None else (False, {})
+        self.on_done(unique_id, record, processed, timings, error)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+# Runs in a worker process: hash and decode one raw crop from a single read, then dither and save it.
+# If the content hash equals known_hash (same file, only its mtime changed) and the output exists, it is skipped.
+# Returns (status, source_hash)
+def reprocess_file(process_function, raw_path, processed_output_file_path, known_hash=None, encoder=None):
+    with open(raw_path, "rb") as f:
+        data = f.read()
+    source_hash = hashlib.sha256(data).hexdigest()
+    if source_hash == known_hash and os.path.exists(processed_output_file_path):
+        return UNCHANGED, source_hash
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        processed, _ = process_and_save(process_function, image, processed_output_file_path, encoder)
+    return (PROCESSED if processed else LOW_RES), source_hash
+
+# Raw crops under raw_dir (recursively) as paths relative to it, in a stable order
+def find_raw_files(raw_dir):
+    raw_files = []
+    for directory, subdirectories, names in os.walk(raw_dir):
+        subdirectories.sort()
+        relative_dir = os.path.relpath(directory, raw_dir)
+        for name in sorted(names):
+            if name.lower().endswith(RAW_EXTENSIONS):
+                raw_files.append(os.path.normpath(os.path.join(relative_dir, name)))
+    return raw_files
+
+# Whether the manifest says this source was already processed with these parameters; the size and
+# mtime check avoids reading the file, a touched but identical file is caught by the hash in the worker
+def _is_unchanged(record, stat, params, processed_output_file_path):
+    return (record is not None and record.params == params
+            and record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns
+            and (record.status == LOW_RES or os.path.exists(processed_output_file_path)))
+
+# Re-run the dithering over a directory tree of raw crops on all cores, no network access.
+# With a ReprocessManifest, sources whose content and params match the last run are skipped
+# (force reprocesses everything but still records the run). Returns a dict of counts per status
+def reprocess_directory(process_function, raw_dir, processed_output_dir, workers=None, manifest=None, params="", force=False, encoder=None):
+    encoder = encoder or ImageEncoder()
+    raw_files = find_raw_files(raw_dir)
+    counts = {PROCESSED: 0, LOW_RES: 0, UNCHANGED: 0, FAILED: 0}
+
+    jobs = []
+    for relative_path in raw_files:
+        raw_path = os.path.join(raw_dir, relative_path)
+        processed_path = os.path.join(processed_output_dir, os.path.splitext(relative_path)[0] + encoder.extension)
+        stat = os.stat(raw_path)
+        record = manifest.get(relative_path) if manifest is not None and not force else None
+        if _is_unchanged(record, stat, params, processed_path):
+            counts[UNCHANGED] += 1
+            continue
+        known_hash = record.source_hash if record is not None and record.params == params else None
+        jobs.append((relative_path, raw_path, processed_path, stat, known_hash))
+    print(f"Found {len(raw_files)} raw images, {counts[UNCHANGED]} unchanged since the last run")
+
+    for directory in sorted({os.path.dirname(processed_path) for _, _, processed_path, _, _ in jobs}):
+        os.makedirs(directory, exist_ok=True)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(reprocess_file, process_function, raw_path, processed_path, known_hash, encoder)
+                   for _, raw_path, processed_path, _, known_hash in jobs]
+        for (relative_path, _, _, stat, _), future in tqdm(zip(jobs, futures), total=len(jobs)):
+            try:
+                status, source_hash = future.result()
+            except Exception as e:
+                print(f"Error reprocessing {relative_path}: {e}")
+                counts[FAILED] += 1
+                continue
+            counts[status] += 1
+            if status == LOW_RES:
+                print(f"Image {relative_path} was not processed due to low resolution.")
+            if manifest is not None:
+                manifest.mark(relative_path, source_hash, stat.st_size, stat.st_mtime_ns, params, status)
+    elapsed = time.perf_counter() - start
+
+    done = counts[PROCESSED] + counts[LOW_RES]
+    print(f"Processed {counts[PROCESSED]} images in {elapsed:.1f} s ({done / elapsed if elapsed > 0 else 0.0:.1f} images/s), "
+          f"{counts[UNCHANGED]} unchanged, {counts[LOW_RES]} low resolution, {counts[FAILED]} failed")
+    return counts
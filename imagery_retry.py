@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+## retry policy for the Bing imagery client
+## 429 and 5xx responses (and connection errors) are retried, other 4xx are not.
+## all workers share one throttle: a Retry-After or a burst of failures pauses every
+## worker, and a circuit breaker stops the whole run for a while when the error rate spikes
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def is_retryable_status(status_code):
+    return status_code in RETRYABLE_STATUS_CODES or (status_code is not None and 500 <= status_code < 600)
+
+# Parse a Retry-After header given either as seconds or as an HTTP date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class ThrottleController:
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0, rate_limiter=None,
+                 breaker_window=50, breaker_threshold=0.5, breaker_cooldown=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # When a rate limiter is shared, throttling lowers its rate and successes slowly raise it back
+        self.rate_limiter = rate_limiter
+        self.max_rate = rate_limiter.rate if rate_limiter is not None else None
+
+        self.breaker_window = breaker_window
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.lock = threading.Lock()
+        self.pause_until = 0.0
+        self.consecutive_failures = 0
+        self.outcomes = deque(maxlen=breaker_window)
+        self.retries = 0
+        self.breaker_trips = 0
+
+    # Block until the shared backoff or an open circuit breaker allows another request
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.pause_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.outcomes.append(True)
+            if self.rate_limiter is not None and self.rate_limiter.rate < self.max_rate:
+                self.rate_limiter.set_rate(min(self.max_rate, self.rate_limiter.rate + 0.1))
+
+    # Record a retryable failure and push the shared pause out; returns how long this worker should back off
+    def record_failure(self, retry_after=None, throttled=False):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.retries += 1
+            self.outcomes.append(False)
+
+            # Exponential backoff on the run-wide failure streak, with jitter so workers do not retry in lockstep
+            backoff = min(self.max_delay, self.base_delay * 2 ** (self.consecutive_failures - 1))
+            delay = retry_after if retry_after is not None else backoff * random.uniform(0.5, 1.0)
+            now = time.monotonic()
+            if throttled or retry_after is not None:
+                self.pause_until = max(self.pause_until, now + delay)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.set_rate(max(self.max_rate * 0.05, self.rate_limiter.rate * 0.7))
+
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.breaker_window // 2 and failures / len(self.outcomes) >= self.breaker_threshold:
+                self.pause_until = max(self.pause_until, now + self.breaker_cooldown)
+                self.breaker_trips += 1
+                self.outcomes.clear()
+                print(f"Circuit breaker open: {failures} failures in the last requests, pausing all fetches for {self.breaker_cooldown:.0f} s")
+            return delay
+
+    def summary(self):
+        return f"{self.retries} retries, circuit breaker opened {self.breaker_trips} times"
+
+# Command line options shared by the fetch scripts
+def add_retry_arguments(parser):
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts per image for throttled (429), 5xx and network failures (default: 5)")
+    parser.add_argument("--breaker-threshold", type=float, default=0.5, help="Error rate over recent requests that pauses the whole run (default: 0.5)")
+    parser.add_argument("--breaker-cooldown", type=float, default=60, help="Seconds to pause all fetches when the circuit breaker opens (default: 60)")
+
+def create_throttle(args, rate_limiter=None):
+    return ThrottleController(
+        max_attempts=args.max_attempts,
+        rate_limiter=rate_limiter,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown
+    )
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+## durable per-unique_id job status for long scraping runs
+## a restarted run loads the completed ids once and skips them with a set lookup
+
+FETCHED = "fetched"
+PROCESSED = "processed"
+LOW_RES = "low_res"
+FAILED = "failed"
+UNCHANGED = "unchanged"
+
+# Statuses that mean there is nothing left to do for a row
+COMPLETED_STATUSES = (PROCESSED, LOW_RES)
+
+class JobManifest:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "unique_id TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, "
+            "updated_at TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.commit()
+
+        rows = self.connection.execute("SELECT unique_id, status, last_error FROM jobs").fetchall()
+        self.completed_ids = {uid for uid, status, _ in rows if status in COMPLETED_STATUSES}
+        self.failed = {uid: error for uid, status, error in rows if status == FAILED}
+
+    def is_completed(self, unique_id):
+        return unique_id in self.completed_ids
+
+    def mark(self, unique_id, status, error=None):
+        now = datetime.now().isoformat(timespec="seconds")
+        # Only a fetch attempt counts towards attempts; later stages just move the status along
+        attempt = 1 if status in (FETCHED, FAILED) else 0
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs (unique_id, status, attempts, last_error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(unique_id) DO UPDATE SET status = excluded.status, attempts = attempts + excluded.attempts, "
+                "last_error = COALESCE(excluded.last_error, last_error), updated_at = excluded.updated_at",
+                (unique_id, status, attempt, error, now)
+            )
+            self.connection.commit()
+            if status in COMPLETED_STATUSES:
+                self.completed_ids.add(unique_id)
+                self.failed.pop(unique_id, None)
+            elif status == FAILED:
+                self.failed[unique_id] = error
+
+    # Date suffix of the output directories of the run this manifest belongs to; the first run stores its own
+    def run_date(self, date):
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO run (key, value) VALUES ('date', ?)", (date,))
+            self.connection.commit()
+            return self.connection.execute("SELECT value FROM run WHERE key = 'date'").fetchone()[0]
+
+    def summary(self):
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "no jobs recorded"
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+## per-source record for directory reprocessing: which raw file (by content hash) was last
+## processed with which dither parameters, so an unchanged file/parameter pair is skipped
+
+class ReprocessRecord:
+    __slots__ = ("source_hash", "size", "mtime_ns", "params", "status")
+
+    def __init__(self, source_hash, size, mtime_ns, params, status):
+        self.source_hash = source_hash
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.params = params
+        self.status = status
+
+class ReprocessManifest:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "source TEXT PRIMARY KEY, "
+            "source_hash TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "params TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "updated_at TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+        rows = self.connection.execute("SELECT source, source_hash, size, mtime_ns, params, status FROM sources").fetchall()
+        self.records = {source: ReprocessRecord(*fields) for source, *fields in rows}
+
+    def get(self, source):
+        return self.records.get(source)
+
+    def mark(self, source, source_hash, size, mtime_ns, params, status):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources (source, source_hash, size, mtime_ns, params, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, source_hash, size, mtime_ns, params, status, now)
+            )
+            self.connection.commit()
+            self.records[source] = ReprocessRecord(source_hash, size, mtime_ns, params, status)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,82 @@
+from PIL import Image
+import numpy as np
+import dithering_engine
+
+MIN_RESOLUTION = 400
+FINAL_SIZE = (1920, 1920)
+
+# Error diffusion kernels as (row offset, column offset, weight) and divisor
+# Atkinson only diffuses 6/8 of the error, which gives its lighter, high-contrast look
+KERNELS = {
+    "floyd-steinberg": ([(0, 1, 7), (1, -1, 3), (1, 0, 5), (1, 1, 1)], 16),
+    "atkinson": ([(0, 1, 1), (0, 2, 1), (1, -1, 1), (1, 0, 1), (1, 1, 1), (2, 0, 1)], 8),
+    "jarvis-judice-ninke": ([(0, 1, 7), (0, 2, 5),
+                             (1, -2, 3), (1, -1, 5), (1, 0, 7), (1, 1, 5), (1, 2, 3),
+                             (2, -2, 1), (2, -1, 3), (2, 0, 5), (2, 1, 3), (2, 2, 1)], 48),
+    "stucki": ([(0, 1, 8), (0, 2, 4),
+                (1, -2, 2), (1, -1, 4), (1, 0, 8), (1, 1, 4), (1, 2, 2),
+                (2, -2, 1), (2, -1, 2), (2, 0, 4), (2, 1, 2), (2, 2, 1)], 42),
+    "sierra": ([(0, 1, 5), (0, 2, 3),
+                (1, -2, 2), (1, -1, 4), (1, 0, 5), (1, 1, 4), (1, 2, 2),
+                (2, -1, 2), (2, 0, 3), (2, 1, 2)], 32),
+}
+
+PAD = 2  # widest kernel reach, in rows below and columns either side
+
+# Smallest skew s such that pixel (y, x), processed at step x + s*y, only receives error
+# from pixels processed at earlier steps
+def wavefront_skew(taps):
+    return max([1] + [-dx // dy + 1 for dy, dx, _ in taps if dy > 0])
+
+# Error-diffuse grayscale pixels (..., H, W) in 0-255 to a boolean array (True = white).
+# Pixels on the same anti-diagonal wavefront do not depend on each other, so each step
+# thresholds a whole wavefront and pushes its error with one strided slice per kernel tap.
+# Leading axes are treated as a batch of equal-sized images; the batch is stored innermost
+# so every pixel of a wavefront is one contiguous run across all images.
+def error_diffuse(pixels, kernel="floyd-steinberg", threshold=128):
+    taps, divisor = KERNELS[kernel]
+    pixels = np.asarray(pixels)
+    *batch, height, width = pixels.shape
+    batch = tuple(batch)
+    padded_width = width + 2 * PAD
+
+    # Preallocated float32 work buffer with padding, flattened over (y, x) so a wavefront is one strided slice
+    buffer = np.zeros((height + PAD, padded_width) + batch, dtype=np.float32)
+    buffer[:height, PAD:PAD + width] = np.moveaxis(pixels, (-2, -1), (0, 1))
+    flat = buffer.reshape((-1,) + batch)
+
+    skew = wavefront_skew(taps)
+    stride = padded_width - skew
+    tap_offsets = [(dy * padded_width + dx, np.float32(weight / divisor)) for dy, dx, weight in taps]
+    white = np.float32(255)
+
+    for step in range(width + skew * (height - 1)):
+        first_row = max(0, -(-(step - width + 1) // skew))
+        last_row = min(height - 1, step // skew)
+        start = first_row * stride + step + PAD
+        stop = last_row * stride + step + PAD + 1
+
+        wavefront = flat[start:stop:stride]
+        quantized = np.where(wavefront >= threshold, white, np.float32(0))
+        error = wavefront - quantized
+        wavefront[...] = quantized
+        for offset, weight in tap_offsets:
+            flat[start + offset:stop + offset:stride] += error * weight
+
+    return np.ascontiguousarray(np.moveaxis(buffer[:height, PAD:PAD + width] >= threshold, (0, 1), (-2, -1)))
+
+# Dither the grayscale image with the selected error diffusion kernel
+def dither(image, kernel="floyd-steinberg"):
+    white = error_diffuse(np.asarray(image), kernel)
+    return Image.fromarray(np.where(white, 255, 0).astype(np.uint8))
+
+# Batch version of dither for an (N, H, W) stack, all tiles diffused together; True where the pixel is white
+def dither_batch(pixels, kernel="floyd-steinberg"):
+    return error_diffuse(pixels, kernel)
+
+# Process the image using one of the error diffusion kernels in KERNELS. The kernel is passed as a
+# dither() option rather than as the registry name, "floyd-steinberg" there is Pillow's built-in dither
+def process_image(image, output_path, aspect_ratio=None, final_size=FINAL_SIZE, kernel="atkinson"):
+    if kernel not in KERNELS:
+        raise ValueError(f"Unknown error diffusion kernel '{kernel}', choose from: {', '.join(KERNELS)}")
+    return dithering_engine.process_image(image, output_path, "atkinson", aspect_ratio, final_size, kernel=kernel)
@@ -1,76 +1,101 @@
 from PIL import Image
 import numpy as np
 import os
+from functools import lru_cache
+from bayer_matrix import bayer_threshold_map
+import dithering_engine
 
-# Generate or load blue noise
-def generate_blue_noise(size):
-    np.random.seed(42)
-    return np.random.rand(size, size) * 255
+MIN_RESOLUTION = 400
+FINAL_SIZE = (1920, 1920)
+BLUE_NOISE_CACHE_DIR = "output/cache/blue_noise"
 
-# Process the image using a hybrid of Bayer matrix and blue noise
-def process_image(image, output_path, aspect_ratio=None, final_size=(1920, 1920)):
-    min_resolution = 400
-    width, height = image.size
-    if width < min_resolution or height < min_resolution:
-        print(f"Image for application_id {os.path.basename(image_path).split('.')[0]} was not processed due to low resolution.")
-        return None
+# Toroidal Gaussian kernel centered on (0, 0), used as the energy filter for void-and-cluster
+def _energy_kernel(size, sigma=1.5):
+    offsets = np.minimum(np.arange(size), size - np.arange(size))
+    distance_squared = offsets[:, None] ** 2 + offsets[None, :] ** 2
+    return np.exp(-distance_squared / (2 * sigma ** 2))
 
-    if aspect_ratio:
-        new_width = int(min(width, height) * aspect_ratio)
-        new_height = int(min(width, height))
-        image = image.resize((new_width, new_height), Image.BILINEAR)
+# Blue-noise threshold array (ranks 0 .. size*size-1) using Ulichney's void-and-cluster method
+def void_and_cluster(size, seed=42, initial_fraction=0.1):
+    rng = np.random.default_rng(seed)
+    kernel = _energy_kernel(size)
+    kernel_fft = np.fft.fft2(kernel)
+    total = size * size
 
-    image = image.convert('L')
-    
-    # Bayer threshold map (4x4)
-    bayer_matrix = np.array([[0, 8, 2, 10],
-                             [12, 4, 14, 6],
-                             [3, 11, 1, 9],
-                             [15, 7, 13, 5]])
-    bayer_matrix = bayer_matrix / 16.0 * 255
+    def energy_of(pattern):
+        return np.real(np.fft.ifft2(np.fft.fft2(pattern) * kernel_fft))
 
-    # Load or generate blue noise
-    blue_noise_size = 64  # Ensure the size is larger than the image dimensions
-    blue_noise = generate_blue_noise(blue_noise_size)
+    def toggle(energy, pattern, index, value):
+        y, x = divmod(index, size)
+        pattern[y, x] = value
+        energy += np.roll(kernel, (y, x), axis=(0, 1)) * (1 if value else -1)
+
+    # Initial pattern: random minority pixels, relaxed until the tightest cluster is also the largest void
+    pattern = np.zeros((size, size), dtype=bool)
+    pattern.flat[rng.choice(total, max(1, int(total * initial_fraction)), replace=False)] = True
+    energy = energy_of(pattern)
+    for _ in range(total):
+        cluster = int(np.argmax(np.where(pattern, energy, -np.inf)))
+        toggle(energy, pattern, cluster, False)
+        void = int(np.argmin(np.where(pattern, np.inf, energy)))
+        toggle(energy, pattern, void, True)
+        if void == cluster:
+            break
+    prototype = pattern.copy()
+    ones = int(pattern.sum())
 
-    # Combine Bayer matrix with blue noise (scaled appropriately)
-    def get_threshold(x, y):
-        i = x % 4
-        j = y % 4
-        blue_noise_offset = blue_noise[y % blue_noise_size, x % blue_noise_size] / 255.0
-        return bayer_matrix[j, i] + blue_noise_offset * 24  # Adjust scale of blue noise
+    ranks = np.zeros(total, dtype=np.int32)
 
-    # Apply dithering with blue noise offsets
-    pixels = np.array(image)
-    for y in range(image.height):
-        for x in range(image.width):
-            threshold = get_threshold(x, y)
-            pixels[y, x] = 255 if pixels[y, x] > threshold else 0
-    
-    image = Image.fromarray(pixels)
+    # Phase 1: remove the tightest clusters from the prototype, ranking downwards
+    energy_phase1 = energy.copy()
+    for rank in range(ones - 1, -1, -1):
+        cluster = int(np.argmax(np.where(pattern, energy_phase1, -np.inf)))
+        toggle(energy_phase1, pattern, cluster, False)
+        ranks[cluster] = rank
 
-    # Convert image to RGBA and make white areas transparent
-    image = image.convert('RGB').convert('RGBA')
-    data = np.array(image)
-    red, green, blue, alpha = data[:,:,0], data[:,:,1], data[:,:,2], data[:,:,3]
-    white_areas = (red == 255) & (green == 255) & (blue == 255)
-    data[white_areas] = [255, 255, 255, 0]
-    image = Image.fromarray(data)
+    # Phases 2 and 3: fill the largest voids from the prototype, ranking upwards
+    pattern = prototype
+    for rank in range(ones, total):
+        void = int(np.argmin(np.where(pattern, np.inf, energy)))
+        toggle(energy, pattern, void, True)
+        ranks[void] = rank
 
-    image = image.resize(final_size, Image.NEAREST)
-    print(f"Rescaling to {final_size} pixels")
+    return ranks.reshape(size, size)
 
-    if aspect_ratio:
-        width, height = image.size
-        crop_percentage = 2
-        crop_pixels = int(min(width, height) * (crop_percentage / 100))
+# Load or generate blue noise (0-255 scale), cached on disk as .npy and memory-mapped on load
+@lru_cache(maxsize=4)
+def generate_blue_noise(size, cache_dir=BLUE_NOISE_CACHE_DIR):
+    path = os.path.join(cache_dir, f"blue_noise_{size}.npy")
+    if not os.path.exists(path):
+        print(f"Generating {size}x{size} blue noise mask (cached in {path})")
+        noise = (void_and_cluster(size) / float(size * size) * 255).astype(np.float32)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(temp_path, noise)
+        os.replace(temp_path, path)
+    return np.load(path, mmap_mode="r")
 
-        left = crop_pixels
-        top = crop_pixels
-        right = width - crop_pixels
-        bottom = height - crop_pixels
+# Bayer matrix combined with blue noise (scaled to noise_scale levels), built once per output shape
+@lru_cache(maxsize=16)
+def noise_threshold_map(shape, blue_noise_size=64, noise_scale=24):
+    height, width = shape
+    blue_noise = generate_blue_noise(blue_noise_size)
+    reps = (-(-height // blue_noise_size), -(-width // blue_noise_size))
+    noise = np.tile(blue_noise, reps)[:height, :width] / 255.0
+    threshold_map = bayer_threshold_map(4, shape) + noise * noise_scale
+    threshold_map.setflags(write=False)
+    return threshold_map
+
+# Apply dithering against the Bayer + blue noise threshold field in one comparison
+def dither(image, blue_noise_size=64, noise_scale=24):
+    pixels = np.asarray(image)
+    threshold_map = noise_threshold_map(pixels.shape, blue_noise_size, noise_scale)
+    return Image.fromarray(np.where(pixels > threshold_map, 255, 0).astype(np.uint8))
 
-        image = image.crop((left, top, right, bottom))
+# Batch version of dither for an (N, H, W) stack, True where the pixel is white
+def dither_batch(pixels, blue_noise_size=64, noise_scale=24):
+    return pixels > noise_threshold_map(pixels.shape[-2:], blue_noise_size, noise_scale)
 
-    image.save(output_path, optimize=True)
-    return image
+# Process the image using a hybrid of Bayer matrix and blue noise
+def process_image(image, output_path, aspect_ratio=None, final_size=FINAL_SIZE):
+    return dithering_engine.process_image(image, output_path, "ordered-noise", aspect_ratio, final_size)
@@ -0,0 +1,80 @@
+import argparse
+import ast
+import json
+import os
+from dithering_engine import get_process_function, add_dither_arguments, load_algorithm
+from imagery_pipeline import reprocess_directory
+from imagery_output import add_output_arguments, create_encoder
+from job_manifest import ReprocessManifest
+
+## re-run a dithering algorithm over an existing directory of raw images on all cores.
+## a manifest remembers each source's content hash and the dither parameters it was
+## processed with, so a rerun only touches new or changed files or changed parameters
+
+# Parse a --param KEY=VALUE option, numbers and booleans are converted, anything else stays a string
+def parse_param(text):
+    key, separator, value = text.partition("=")
+    if not separator or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{text}'")
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return key.replace("-", "_"), value
+
+# Everything that changes the output; a source is reprocessed when this differs from its last run
+def params_key(args, options):
+    return json.dumps({
+        "dither": args.dither,
+        "output_mode": args.output_mode,
+        "output_format": args.output_format,
+        "compress_level": args.compress_level,
+        "optimize": args.optimize,
+        "aspect_ratio": args.aspect_ratio,
+        "final_size": args.final_size,
+        "options": options,
+    }, sort_keys=True)
+
+def main(args):
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: The input folder '{args.input_dir}' does not exist.")
+        return
+
+    options = dict(args.param)
+    final_size = tuple(args.final_size) if args.final_size else None
+    process_image = get_process_function(args.dither, args.output_mode, aspect_ratio=args.aspect_ratio, final_size=final_size, **options)
+    load_algorithm(args.dither)  # surface a bad module before starting the pool
+
+    manifest = None
+    if not args.no_manifest:
+        manifest = ReprocessManifest(args.manifest or os.path.join(args.output_dir, "reprocess_manifest.sqlite"))
+
+    print(f"Reprocessing {args.input_dir} into {args.output_dir} with {args.dither}")
+    reprocess_directory(
+        process_image,
+        args.input_dir,
+        args.output_dir,
+        workers=args.workers,
+        manifest=manifest,
+        params=params_key(args, options),
+        force=args.force,
+        encoder=create_encoder(args)
+    )
+    if manifest is not None:
+        manifest.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run dithering over a directory of raw images, skipping images that have not changed")
+    parser.add_argument("input_dir", help="Directory of raw images (searched recursively)")
+    parser.add_argument("output_dir", help="Directory for the processed images, the input folder structure is kept")
+    add_dither_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--param", type=parse_param, action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra option for the dithering algorithm, e.g. --param bayer_size=8 (repeatable)")
+    parser.add_argument("--aspect-ratio", type=float, default=None, help="Resize to this aspect ratio before dithering and crop 2%% from the edges")
+    parser.add_argument("--final-size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"), help="Output size (default: the algorithm's FINAL_SIZE)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--manifest", default=None, help="Path of the reprocess manifest (default: reprocess_manifest.sqlite in the output directory)")
+    parser.add_argument("--no-manifest", action="store_true", help="Do not record or skip unchanged images")
+    parser.add_argument("--force", action="store_true", help="Reprocess every image even if it is unchanged")
+    main(parser.parse_args())
@@ -1,16 +1,24 @@
 import os
 import argparse
-import imageio.v2 as imageio
-from PIL import Image, ImageSequence
+from PIL import Image
 from tqdm import tqdm
 import re
-import numpy as np
 import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from animation_writers import ANIMATION_WRITERS, FramePalette, check_webp_support
+
+# Palette modes: a palette per frame (Pillow's quantizer for GIF, full RGBA for the other formats),
+# one palette built from all frames of a group, or fixed black/white/transparent for dithered frames
+PALETTE_MODES = ("adaptive", "global", "fixed")
+
+# Memory of a worker process before it holds any frames (interpreter, NumPy, Pillow)
+PROCESS_MEMORY = 64 << 20
 
 # note that based on optional params, the jitter effect only occurs if
 # the frame disposal method is '3'
 
-def resize_to_center(image, scale, bg_color, jitter=0.75):
+def resize_to_center(image, scale, bg_color, jitter=0.75, rng=random):
     width, height = image.size
     new_width = int(width * scale)
     new_height = int(height * scale)
@@ -18,98 +26,178 @@ def resize_to_center(image, scale, bg_color, jitter=0.75):
     
     new_image = Image.new("RGBA", (width, height), bg_color)
     
-    jitter_x = int((width - new_width) * jitter * (random.random() - 0.5))
-    jitter_y = int((height - new_height) * jitter * (random.random() - 0.5))
+    jitter_x = int((width - new_width) * jitter * (rng.random() - 0.5))
+    jitter_y = int((height - new_height) * jitter * (rng.random() - 0.5))
     
     new_image.paste(resized_image, ((width - new_width) // 2 + jitter_x, (height - new_height) // 2 + jitter_y), resized_image)
     return new_image
 
-def create_gif(image_files, gif_path, ping_pong=False, duration=250, disposal=2, bg_color=(0, 0, 0, 0)):
-    images = [Image.open(x).convert("RGBA") for x in tqdm(image_files, desc="Reading images")]
-    
+# Frame order for a group: forward, then back again without repeating the end frames when ping-ponging
+def frame_sequence(image_files, ping_pong=False):
     if ping_pong:
-        images = images + images[-2:0:-1]
-    
-    if disposal == 3:
-        scaled_images = []
-        scale = 1.0
-        for img in images:
-            scaled_images.append(resize_to_center(img, scale, bg_color))
-            scale *= random.uniform(0.96, 1.01)
-        images = scaled_images
-    
-    images[0].save(
-        gif_path,
-        save_all=True,
-        append_images=images[1:],
-        optimize=True,
-        duration=duration,
-        loop=0,
-        disposal=disposal
-    )
-
-def create_gif_batch(image_files, gif_path, batch_size=500, ping_pong=False, duration=250, disposal=2, bg_color=(0, 0, 0, 0)):
-    num_batches = len(image_files) // batch_size
-    temp_gifs = []
-
-    for i in tqdm(range(num_batches + 1), desc="Processing batches"):
-        batch_images = image_files[i * batch_size: (i + 1) * batch_size]
-        if not batch_images:
-            continue
-        images = [imageio.imread(x, mode='RGBA') for x in tqdm(batch_images, desc="Reading images", leave=False)]
-        if ping_pong:
-            images = images + images[-2:0:-1]
-        if disposal == 3:
-            scaled_images = []
-            scale = 1.0
-            for img in images:
-                pil_img = Image.fromarray(img)
-                scaled_images.append(resize_to_center(pil_img, scale, bg_color))
-                scale *= random.uniform(0.96, 1.01)
-            images = [np.array(img) for img in scaled_images]
-        temp_gif_path = f"temp_{i}.gif"
-        imageio.mimsave(temp_gif_path, images, 'GIF', duration=duration / 1000.0, loop=0, disposal=disposal)
-        temp_gifs.append(temp_gif_path)
-
-    final_gif_frames = []
-
-    for temp_gif in tqdm(temp_gifs, desc="Concatenating GIFs"):
-        with Image.open(temp_gif) as img:
-            for frame in ImageSequence.Iterator(img):
-                final_frame = frame.copy()
-                final_gif_frames.append(final_frame)
-
-    final_gif_frames[0].save(
-        gif_path,
-        save_all=True,
-        append_images=final_gif_frames[1:],
-        duration=duration,
-        loop=0,
-        disposal=disposal
-    )
-
-    for temp_gif in temp_gifs:
-        os.remove(temp_gif)
+        return list(image_files) + list(image_files[-2:0:-1])
+    return list(image_files)
+
+def load_frame(image_file, convert):
+    with Image.open(image_file) as image:
+        image.load()
+        return image.convert("RGBA") if convert else image
+
+# Decode and prepare the frames in order. Decoding runs on a thread pool (Pillow releases the GIL
+# while decoding), with up to twice as many frames read ahead as threads, so memory stays bounded.
+# With convert=False frames stay in their decoded mode (e.g. 1-bit palette PNGs) unless jitter needs RGBA.
+# A seed makes the disposal 3 jitter repeatable, so the frames can be read twice
+def iter_frames(image_files, ping_pong=False, disposal=2, bg_color=(0, 0, 0, 0), convert=True, seed=None, read_threads=4):
+    rng = random.Random(seed) if seed is not None else random
+    scale = 1.0
+    with ThreadPoolExecutor(max_workers=read_threads, thread_name_prefix="frame-reader") as executor:
+        pending = deque()
+        sequence = iter(frame_sequence(image_files, ping_pong))
+        while True:
+            for image_file in sequence:
+                pending.append(executor.submit(load_frame, image_file, convert or disposal == 3))
+                if len(pending) >= read_threads * 2:
+                    break
+            if not pending:
+                break
+            frame = pending.popleft().result()
+            # The jitter draws from the random stream, so it stays here, in frame order
+            if disposal == 3:
+                frame = resize_to_center(frame, scale, bg_color, rng=rng)
+                scale *= rng.uniform(0.96, 1.01)
+            yield frame
+
+# Stream the frames into an animation in output_format (see ANIMATION_WRITERS), each frame is encoded
+# once and written straight to the file. With delta=True only the rectangle that changed since the
+# previous frame is written (GIF only, needs a global or fixed palette). Returns the animation's
+# statistics; runs in a worker process when groups are encoded in parallel, progress=False then
+# keeps the workers' progress bars off the console
+def create_animation(image_files, output_path, output_format="gif", ping_pong=False, duration=250, disposal=2, bg_color=(0, 0, 0, 0),
+                     palette_mode="adaptive", delta=False, read_threads=4, progress=True):
+    total = len(frame_sequence(image_files, ping_pong))
+    seed = random.randrange(1 << 30)
+    frames = lambda: iter_frames(image_files, ping_pong, disposal, bg_color, convert=palette_mode == "adaptive", seed=seed, read_threads=read_threads)
+
+    palette = None
+    if palette_mode == "fixed":
+        palette = FramePalette.fixed()
+    elif palette_mode == "global":
+        palette = FramePalette.from_frames(tqdm(frames(), total=total, desc="Building palette", leave=False, disable=not progress), transparent=delta)
+
+    options = {"delta": delta} if delta else {}
+    with ANIMATION_WRITERS[output_format](output_path, duration=duration, loop=0, disposal=disposal, palette=palette, **options) as writer:
+        for frame in tqdm(frames(), total=total, desc="Encoding frames", leave=False, disable=not progress):
+            writer.append(frame)
+    return {
+        "bytes": os.path.getsize(output_path),
+        "frames": writer.frame_count,
+        "merged_frames": writer.merged_frames,
+        "encoded_pixels": writer.encoded_pixels,
+        "full_pixels": writer.frame_count * writer.size[0] * writer.size[1],
+    }
+
+# The GIF-only entry point, kept for existing callers
+def create_gif(image_files, gif_path, **options):
+    return create_animation(image_files, gif_path, "gif", **options)
+
+# Rough peak memory of encoding one group: the frames read ahead plus the frame being encoded with
+# its index arrays and delta canvas, all counted as RGBA at the first frame's size
+def estimate_group_memory(image_files, palette_mode="adaptive", read_threads=4):
+    with Image.open(image_files[0]) as image:
+        width, height = image.size
+    estimate = PROCESS_MEMORY + width * height * 4 * (read_threads * 2 + 4)
+    if palette_mode == "global":
+        estimate += 32 << 20  # the palette's color lookup table, if every color gets used
+    return estimate
+
+# Half the physical memory, where the platform reports it
+def default_memory_budget():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+# Encode groups on up to `jobs` worker processes, starting a group only while the estimates of the
+# running groups fit the memory budget (a group over budget on its own still runs, alone).
+# groups is a list of (prefix, image files, output path, estimate); yields (prefix, output path, stats or exception)
+def run_groups(groups, jobs, memory_budget=None, **animation_options):
+    queue = deque(groups)
+    running = {}
+    in_use = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while queue or running:
+            while queue and len(running) < jobs and (not running or memory_budget is None or in_use + queue[0][3] <= memory_budget):
+                prefix, image_files, output_path, estimate = queue.popleft()
+                future = executor.submit(create_animation, image_files, output_path, progress=False, **animation_options)
+                running[future] = (prefix, output_path, estimate)
+                in_use += estimate
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                prefix, output_path, estimate = running.pop(future)
+                in_use -= estimate
+                try:
+                    yield prefix, output_path, future.result()
+                except Exception as e:
+                    yield prefix, output_path, e
+
+# Group the PNGs of a folder into animations by the prefix before the first underscore,
+# each group's files sorted by the number after it
+def group_images(input_folder):
+    grouped_images = {}
+    for img in os.listdir(input_folder):
+        match = re.match(r"([^_]+)_(\d+).png", img)
+        if match:
+            prefix = match.group(1)
+            index = int(match.group(2))
+            if prefix not in grouped_images:
+                grouped_images[prefix] = []
+            grouped_images[prefix].append((index, os.path.join(input_folder, img)))
+    return {prefix: [path for _, path in sorted(files)] for prefix, files in grouped_images.items()}
+
+def print_animation_stats(output_path, stats, delta=False):
+    print(f"Created '{output_path}' ({stats['bytes']} bytes, {stats['frames']} frames, {stats['merged_frames']} repeated frames merged)")
+    if delta:
+        # A pixel fraction, not bytes: LZW output does not scale with area, benchmark_animation.py --delta compares file sizes
+        print(f"  Delta frame rectangles cover {stats['encoded_pixels']} of {stats['full_pixels']} pixels "
+              f"({stats['encoded_pixels'] / stats['full_pixels']:.0%} of the frame area)")
 
 def hex_to_rgba(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4)) + (255,)
 
 def main():
-    parser = argparse.ArgumentParser(description="Create unique GIFs from a directory of PNG images")
+    parser = argparse.ArgumentParser(description="Create unique GIFs (or other animations) from a directory of PNG images")
     parser.add_argument("input_folder", help="Path to the input folder containing PNG images")
     parser.add_argument("output_folder", help="Path to the output folder where GIFs will be saved")
-    parser.add_argument("--batch-size", type=int, default=500, help="Batch size for processing images (default: 500)")
+    parser.add_argument("--format", choices=list(ANIMATION_WRITERS), default="gif",
+                        help="Output format: gif, webp (lossless animated WebP), apng or npz (raw frame stack) (default: gif)")
+    parser.add_argument("--batch-size", type=int, default=500, help="No longer used, frames are streamed into the GIF one at a time")
     parser.add_argument("--ping-pong", action="store_true", help="Enable ping-pong looping for the GIFs")
     parser.add_argument("--duration", type=int, default=250, help="Duration of each frame in milliseconds (default: 250)")
     parser.add_argument("--disposal", type=int, default=2, help="Frame disposal method (default: 2)")
+    parser.add_argument("--palette", choices=PALETTE_MODES, default="adaptive",
+                        help="Palette: per frame for GIF and full RGBA otherwise (adaptive), one shared palette per group (global) or black/white/transparent (fixed) (default: adaptive)")
+    parser.add_argument("--delta", action="store_true",
+                        help="Write only the changed rectangle of each frame, unchanged pixels transparent (needs --palette global or fixed)")
     parser.add_argument("--bg-color", type=str, default="#000000", help="Background color to replace transparent pixels (default: #000000)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Groups encoded in parallel worker processes (default: one per core)")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="Only start another group while the running groups' estimated memory fits in this many MB (default: half the physical memory)")
+    parser.add_argument("--read-threads", type=int, default=4, help="Threads decoding frames ahead of the encoder, per group (default: 4)")
 
     args = parser.parse_args()
+    if args.delta and args.palette == "adaptive":
+        parser.error("--delta needs --palette global or fixed")
+    if args.delta and args.format != "gif":
+        parser.error("--delta is only for --format gif (WebP finds changed rectangles itself)")
+    if args.format == "webp":
+        try:
+            check_webp_support()
+        except RuntimeError as e:
+            parser.error(str(e))
 
     input_folder = args.input_folder
     output_folder = args.output_folder
-    batch_size = args.batch_size
     ping_pong = args.ping_pong
     duration = args.duration
     disposal = args.disposal
@@ -117,11 +205,14 @@ def main():
 
     print(f"Input folder: {input_folder}")
     print(f"Output folder: {output_folder}")
-    print(f"Batch size: {batch_size}")
     print(f"Ping-pong mode: {'enabled' if ping_pong else 'disabled'}")
     print(f"Frame duration: {duration} ms")
     print(f"Frame disposal: {disposal}")
     print(f"Background color: {args.bg_color}")
+    print(f"Output format: {args.format}")
+    print(f"Palette: {args.palette}")
+    print(f"Delta frames: {'enabled' if args.delta else 'disabled'}")
+    memory_budget = args.memory_budget << 20 if args.memory_budget else default_memory_budget()
 
     if not os.path.exists(input_folder):
         print(f"Error: The input folder '{input_folder}' does not exist.")
@@ -134,26 +225,31 @@ def main():
     images = [img for img in os.listdir(input_folder) if img.endswith(".png")]
     print(f"Found {len(images)} images in the input folder")
 
-    # Group images by the prefix before the first underscore
-    grouped_images = {}
-    for img in images:
-        match = re.match(r"([^_]+)_(\d+).png", img)
-        if match:
-            prefix = match.group(1)
-            index = int(match.group(2))
-            if prefix not in grouped_images:
-                grouped_images[prefix] = []
-            grouped_images[prefix].append((index, os.path.join(input_folder, img)))
-
+    grouped_images = group_images(input_folder)
     print(f"Grouped images into {len(grouped_images)} categories")
 
-    for prefix, files in grouped_images.items():
-        print(f"Processing group '{prefix}' with {len(files)} images")
-        files.sort()  # Sort by the numerical index
-        sorted_files = [f[1] for f in files]
-        output_gif = os.path.join(output_folder, f"{prefix}.gif")
-        create_gif_batch(sorted_files, output_gif, batch_size=batch_size, ping_pong=ping_pong, duration=duration, disposal=disposal, bg_color=bg_color)
-        print(f"Created GIF '{output_gif}'")
+    animation_options = {"output_format": args.format, "ping_pong": ping_pong, "duration": duration, "disposal": disposal, "bg_color": bg_color,
+                         "palette_mode": args.palette, "delta": args.delta, "read_threads": args.read_threads}
+    extension = ANIMATION_WRITERS[args.format].EXTENSION
+    groups = []
+    for prefix, sorted_files in grouped_images.items():
+        output_path = os.path.join(output_folder, f"{prefix}{extension}")
+        groups.append((prefix, sorted_files, output_path, estimate_group_memory(sorted_files, args.palette, args.read_threads)))
+
+    jobs = max(1, min(args.jobs, len(groups)))
+    if jobs == 1:
+        for prefix, sorted_files, output_path, _ in groups:
+            print(f"Processing group '{prefix}' with {len(sorted_files)} images")
+            print_animation_stats(output_path, create_animation(sorted_files, output_path, **animation_options), args.delta)
+        return
+
+    budget_text = f", memory budget {memory_budget >> 20} MB" if memory_budget else ""
+    print(f"Encoding {len(groups)} groups on {jobs} worker processes{budget_text}")
+    for prefix, output_path, stats in tqdm(run_groups(groups, jobs, memory_budget, **animation_options), total=len(groups)):
+        if isinstance(stats, Exception):
+            print(f"Failed to create {args.format} for group '{prefix}': {stats}")
+        else:
+            print_animation_stats(output_path, stats, args.delta)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+import importlib
+import sys
+import types
+from argparse import Namespace
+import pytest
+from imagery_input import PointRow
+from job_manifest import PROCESSED, FAILED
+
+## fetch script regression tests, run with python -m pytest
+
+@pytest.fixture
+def extract(monkeypatch):
+    # The script reads the API key from a local config module that is not part of the repository
+    monkeypatch.setitem(sys.modules, "config", types.SimpleNamespace(bing_api_key="test"))
+    return importlib.import_module("extractBingMapsImagery")
+
+# An interrupted run restarted on a later day finds the same manifest, skips what it completed
+# and keeps writing into the first day's output directories
+def test_restart_on_a_later_day_skips_completed_ids(extract, monkeypatch, tmp_path):
+    args = Namespace(mode="point", processed_output_dir_point=str(tmp_path / "processed" / "point"), manifest=None, no_manifest=False)
+
+    manifest, run_date = extract.open_manifest(args, "20260101")
+    assert run_date == "20260101"
+    manifest.mark("1", PROCESSED)
+    manifest.mark("2", FAILED, "HTTP 500")
+    manifest.close()
+
+    manifest, run_date = extract.open_manifest(args, "20260102")
+    assert run_date == "20260101"
+    monkeypatch.setattr(extract, "manifest", manifest)
+    counts = {"skipped": 0, "requeued": 0}
+    rows = [PointRow(unique_id, 0.0, 0.0, 0) for unique_id in ("1", "2", "3")]
+    assert [unique_id for unique_id, _ in extract.pending_rows(rows, counts)] == ["2", "3"]
+    assert counts == {"skipped": 1, "requeued": 1}
+    manifest.close()
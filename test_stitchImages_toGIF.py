@@ -0,0 +1,78 @@
+import gc
+import types
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence, features
+import animation_writers
+from animation_writers import ANIMATION_WRITERS, StreamingWebPWriter
+from stitchImages_toGIF import create_animation, group_images
+
+## stitcher regression tests, run with python -m pytest
+
+def write_frames(folder, prefix, frames):
+    for index, frame in enumerate(frames):
+        frame.save(folder / f"{prefix}_{index}.png")
+
+requires_webp = pytest.mark.skipif(not features.check("webp"), reason="Pillow built without WebP")
+
+# Every output format, with WebP skipped where Pillow cannot write it
+FORMATS = [pytest.param(name, marks=requires_webp if name == "webp" else ()) for name in sorted(ANIMATION_WRITERS)]
+
+# A global palette built from frames with no opaque pixel used to have no entry to match colors to
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_global_palette_fully_transparent_group(tmp_path, output_format):
+    write_frames(tmp_path, "empty", [Image.new("RGBA", (16, 16), (0, 0, 0, 0)) for _ in range(3)])
+    output_path = tmp_path / ("empty" + ANIMATION_WRITERS[output_format].EXTENSION)
+
+    stats = create_animation(group_images(str(tmp_path))["empty"], str(output_path), output_format,
+                             palette_mode="global", disposal=1, progress=False)
+
+    assert output_path.exists()
+    assert stats["frames"] == 1  # identical frames are merged
+    if output_format == "gif":
+        with Image.open(output_path) as gif:
+            for frame in ImageSequence.Iterator(gif):
+                assert np.asarray(frame.convert("RGBA"))[..., 3].max() == 0
+
+# An error while stitching removes the temp file and leaves no archive or encoder writing into it
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_error_removes_temp_file(tmp_path, output_format):
+    output_path = tmp_path / ("broken" + ANIMATION_WRITERS[output_format].EXTENSION)
+    with pytest.raises(ValueError):
+        with ANIMATION_WRITERS[output_format](str(output_path)) as writer:
+            writer.append(Image.new("RGBA", (16, 16), (255, 0, 0, 255)))
+            writer.append(Image.new("RGBA", (16, 16), (0, 0, 255, 255)))
+            writer.append(Image.new("RGBA", (8, 8), (0, 255, 0, 255)))  # wrong size
+    del writer
+    gc.collect()
+    assert list(tmp_path.iterdir()) == []
+
+def write_webp(path, frames):
+    with StreamingWebPWriter(str(path), duration=100, disposal=1) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+def read_webp(path):
+    with Image.open(path) as webp:
+        return [(np.asarray(frame.convert("RGBA")), frame.info["duration"]) for frame in ImageSequence.Iterator(webp)]
+
+# Without a usable private encoder the WebP writer falls back to the public save_all and writes the same animation
+@requires_webp
+@pytest.mark.parametrize("private_encoder", [
+    None,  # missing, or Pillow older than the signatures it is called with
+    types.SimpleNamespace(WebPAnimEncoder=lambda *args: (_ for _ in ()).throw(TypeError("signature changed"))),
+], ids=["missing", "type_error"])
+def test_webp_fallback_to_save_all(tmp_path, monkeypatch, private_encoder):
+    rng = np.random.default_rng(0)
+    frames = [Image.fromarray(rng.integers(0, 256, (16, 16, 3), dtype=np.uint8)).convert("RGBA") for _ in range(3)]
+    frames[1] = frames[0]  # merged into one frame shown twice as long
+
+    write_webp(tmp_path / "streamed.webp", frames)
+    monkeypatch.setattr(animation_writers, "_streaming_webp", lambda: private_encoder)
+    write_webp(tmp_path / "fallback.webp", frames)
+
+    streamed, fallback = read_webp(tmp_path / "streamed.webp"), read_webp(tmp_path / "fallback.webp")
+    assert [duration for _, duration in fallback] == [duration for _, duration in streamed] == [200, 100]
+    for (expected, _), (actual, _) in zip(streamed, fallback):
+        assert np.array_equal(actual, expected)